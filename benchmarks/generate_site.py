@@ -0,0 +1,128 @@
+"""Create a synthetic site in the layout of `htmd start` for benchmarks."""
+import contextlib
+import datetime as dt
+import io
+from pathlib import Path
+import random
+
+import click
+from htmd.cli.start import start
+
+
+WORDS = [
+    'build', 'cache', 'compile', 'deploy', 'draft', 'feed', 'freeze', 'index',
+    'layout', 'markdown', 'page', 'parse', 'post', 'preview', 'publish',
+    'render', 'search', 'site', 'static', 'style', 'tag', 'template', 'theme',
+    'update', 'verify', 'write',
+]
+
+CODE_BLOCK = '''```python
+def render(posts):
+    for post in sorted(posts, key=lambda p: p.published):
+        yield post.title, len(post.body)
+```'''
+
+
+def sentence(rng: random.Random, length: int) -> str:
+    words = rng.choices(WORDS, k=length)
+    return ' '.join(words).capitalize() + '.'
+
+
+def paragraph(rng: random.Random) -> str:
+    return ' '.join(sentence(rng, rng.randint(6, 16)) for _ in range(rng.randint(3, 6)))
+
+
+def post_body(rng: random.Random) -> str:
+    sections = [paragraph(rng)]
+    for _ in range(rng.randint(1, 4)):
+        sections.append(f'## {sentence(rng, 3)[:-1]}')
+        sections.append(paragraph(rng))
+        if rng.random() < 0.5:  # noqa: PLR2004
+            sections.append(CODE_BLOCK)
+        if rng.random() < 0.3:  # noqa: PLR2004
+            links = (
+                f'- [{rng.choice(WORDS)}](https://example.com/{i})'
+                for i in range(3)
+            )
+            sections.append('\n'.join(links))
+    return '\n\n'.join(sections) + '\n'
+
+
+def post_front_matter(
+    rng: random.Random,
+    index: int,
+    *,
+    authors: list[str],
+    tags: list[str],
+) -> list[str]:
+    start_date = dt.date(2010, 1, 1)
+    published = start_date + dt.timedelta(days=rng.randint(0, 365 * 15))
+    lines = [
+        f'title: {sentence(rng, rng.randint(2, 8))[:-1]} {index}',
+        f'author: {rng.choice(authors)}',
+        f'published: {published.isoformat()}',
+        f'tags: [{", ".join(rng.sample(tags, rng.randint(1, 4)))}]',
+    ]
+    if rng.random() < 0.3:  # noqa: PLR2004
+        updated = published + dt.timedelta(days=rng.randint(1, 365))
+        lines.append(f'updated: {updated.isoformat()}')
+    if rng.random() < 0.5:  # noqa: PLR2004
+        lines.append(f'subtitle: {sentence(rng, 6)}')
+    if rng.random() < 0.5:  # noqa: PLR2004
+        lines.append(f'description: {sentence(rng, 12)}')
+    return lines
+
+
+def generate_site(  # noqa: PLR0913
+    site_dir: Path,
+    posts: int,
+    *,
+    seed: int = 0,
+    drafts: float = 0.02,
+    draft_builds: float = 0.01,
+    protected: float = 0.001,
+) -> None:
+    """
+    Create `posts` posts in a new site in `site_dir`.
+
+    `drafts`, `draft_builds`, and `protected` are the fraction of posts
+    that are drafts, draft build posts, and password protected posts.
+    Password protected posts are slow to sync so they are rare by default.
+    """
+    rng = random.Random(seed)  # noqa: S311
+    site_dir.mkdir(parents=True, exist_ok=True)
+    with contextlib.chdir(site_dir), contextlib.redirect_stdout(io.StringIO()):
+        start.main([], standalone_mode=False)
+
+    authors = [f'Author {i}' for i in range(max(1, posts // 500))]
+    tags = [f'{rng.choice(WORDS)}-{i}' for i in range(max(5, posts // 50))]
+    posts_dir = site_dir / 'posts'
+    for index in range(posts):
+        lines = post_front_matter(rng, index, authors=authors, tags=tags)
+        folder = posts_dir / f'{index // 1000:03}'
+        kind = rng.random()
+        if kind < protected:
+            lines.append('password: true')
+            folder = posts_dir / 'password-protect'
+        elif kind < protected + draft_builds:
+            lines.append('draft: build')
+        elif kind < protected + draft_builds + drafts:
+            lines.append('draft: true')
+        folder.mkdir(exist_ok=True)
+        front_matter = '\n'.join(lines)
+        contents = f'---\n{front_matter}\n...\n{post_body(rng)}'
+        (folder / f'post-{index}.md').write_text(contents)
+
+
+@click.command()
+@click.argument('site_dir', type=click.Path(file_okay=False, path_type=Path))
+@click.option('--posts', default=1000, show_default=True, type=click.IntRange(min=1))
+@click.option('--seed', default=0, show_default=True)
+def main(site_dir: Path, posts: int, seed: int) -> None:
+    """Create a site with synthetic posts in SITE_DIR."""
+    generate_site(site_dir, posts, seed=seed)
+    click.echo(f'Created {posts} posts in {site_dir}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,158 @@
+"""
+Time htmd on synthetic sites.
+
+python -m benchmarks.run --posts 1000 --posts 10000 --output results.json
+python -m benchmarks.run --posts 1000 --compare results.json
+"""
+from collections.abc import Callable
+import contextlib
+from importlib.metadata import version
+import json
+from pathlib import Path
+import platform
+import shutil
+import tempfile
+import threading
+import time
+import typing
+
+import click
+from flask import Flask
+from htmd import site
+from htmd.cli.build import build
+from htmd.cli.preview import PostHandler
+from htmd.cli.verify import verify
+from htmd.site.posts import feed, get_posts, post
+from htmd.utils import sync_posts
+
+from .generate_site import generate_site
+
+
+def timed[T](func: Callable[[], T]) -> tuple[T, float]:
+    start = time.perf_counter()
+    ret = func()
+    return ret, time.perf_counter() - start
+
+
+def run_build(*args: str) -> float:
+    _, seconds = timed(lambda: build.main(['--full', *args], standalone_mode=False))
+    return seconds
+
+
+def preview_reload(app: Flask) -> float:
+    """
+    Time changing a post until the post can be served by `htmd preview`.
+
+    Uses the handler `htmd preview` runs when a post file changes.
+    """
+    post_path = Path('posts') / 'example.md'
+    post_path.write_text(post_path.read_text() + '\nChanged.\n')
+
+    def reload() -> None:
+        handler = PostHandler(threading.Event(), app)
+        handler.get_file_hash(post_path)
+        example = get_posts(app).get_or_404('example')
+        published = example.meta['published']
+        with app.test_request_context():
+            post(
+                published.strftime('%Y'),
+                published.strftime('%m'),
+                published.strftime('%d'),
+                'example',
+            )
+
+    _, seconds = timed(reload)
+    return seconds
+
+
+def benchmark_site(site_dir: Path) -> dict[str, float]:
+    results: dict[str, float] = {}
+    with contextlib.chdir(site_dir):
+        app, results['create_app'] = timed(site.create_app)
+        _, results['verify'] = timed(
+            lambda: verify.main([], obj={'flask_app': app}, standalone_mode=False),
+        )
+        # The first sync sets dates, UUIDs, and passwords in the post files
+        _, results['sync_posts_first'] = timed(lambda: sync_posts(app))
+        _, results['sync_posts'] = timed(lambda: sync_posts(app))
+
+        def get_feed() -> None:
+            with app.test_request_context():
+                feed()
+
+        _, results['feed'] = timed(get_feed)
+        results['preview_reload'] = preview_reload(app)
+
+        results['build_full'] = run_build()
+        results['build_full_jobs_4'] = run_build('--jobs', '4')
+        _, results['build_unchanged'] = timed(
+            lambda: build.main([], standalone_mode=False),
+        )
+    return results
+
+
+def compare(results: dict[str, typing.Any], previous: dict[str, typing.Any]) -> None:
+    for posts, timings in results['sites'].items():
+        previous_timings = previous['sites'].get(posts, {})
+        click.echo(f'{posts} posts')
+        for name, seconds in timings.items():
+            line = f'  {name:<20}{seconds:>10.3f}s'
+            if name in previous_timings:
+                line += f'  {seconds / previous_timings[name]:>6.2f}x'
+            click.echo(line)
+
+
+@click.command()
+@click.option(
+    '--posts',
+    default=[1000],
+    help='Number of posts in a site, can be given more than once.',
+    multiple=True,
+    show_default=True,
+    type=click.IntRange(min=1),
+)
+@click.option('--seed', default=0, show_default=True)
+@click.option(
+    '--output',
+    help='Write the results as JSON to this file.',
+    type=click.Path(dir_okay=False, path_type=Path),
+)
+@click.option(
+    '--compare', 'compare_path',
+    help='Show each time relative to the results in this file.',
+    type=click.Path(dir_okay=False, exists=True, path_type=Path),
+)
+def main(
+    posts: tuple[int, ...],
+    seed: int,
+    output: Path | None,
+    compare_path: Path | None,
+) -> None:
+    results: dict[str, typing.Any] = {
+        'htmd': version('htmd'),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'sites': {},
+    }
+    for count in posts:
+        site_dir = Path(tempfile.mkdtemp(prefix=f'htmd-benchmark-{count}-'))
+        try:
+            start = time.perf_counter()
+            generate_site(site_dir, count, seed=seed)
+            generate_seconds = time.perf_counter() - start
+            timings = {'generate_site': generate_seconds}
+            timings.update(benchmark_site(site_dir))
+        finally:
+            shutil.rmtree(site_dir)
+        results['sites'][str(count)] = timings
+
+    previous: dict[str, typing.Any] = {'sites': {}}
+    if compare_path:
+        previous = json.loads(compare_path.read_text())
+    compare(results, previous)
+    if output:
+        output.write_text(json.dumps(results, indent=2))
+
+
+if __name__ == '__main__':
+    main()
@@ -1,10 +1,25 @@
+import contextlib
+from pathlib import Path
 import subprocess
 import sys
 import warnings
 
 import click
+from flask import Flask
+from pagefind.index import IndexConfig
 
 from .. import site
+from ..site.encrypted_cache import prune_encrypted_cache
+from ..site.html_cache import prune_html_cache
+from ..site.html_minify import minify_html_files
+from ..site.manifest import BuildManifest
+from ..site.profiler import BuildProfile
+from ..site.search_index import (
+    get_site_digests,
+    remove_index,
+    SearchIndexDigests,
+)
+from ..site.template_cache import precompile_templates
 from ..utils import (
     send_stderr,
     sync_posts,
@@ -18,47 +33,197 @@ warnings.filterwarnings('ignore', '.*Nothing frozen for endpoints.*')
 @click.command('build', short_help='Create static version of the site.')
 @click.pass_context
 @click.option(
-    '--minify-css', '--css-minify',
-    '/--no-minify-css', '--no-css-minify',
+    '--minify-css/--no-minify-css',
+    '--css-minify/--no-css-minify',
     default=True,
     help='If CSS should be minified',
     is_flag=True,
     show_default=True,
 )
 @click.option(
-    '--minify-js', '--js-minify',
-    '/--no-minify-js', '--no-js-minify',
+    '--minify-js/--no-minify-js',
+    '--js-minify/--no-js-minify',
     default=True,
     help='If JavaScript should be minified',
     is_flag=True,
     show_default=True,
 )
-def build(
+@click.option(
+    '--fingerprint',
+    default=False,
+    help='Add a hash of the contents to the names of CSS and JavaScript files.',
+    is_flag=True,
+)
+@click.option(
+    '--jobs', '-j',
+    default=1,
+    help='Number of processes used to render pages and minify files.',
+    show_default=True,
+    type=click.IntRange(min=1),
+)
+@click.option(
+    '--full',
+    default=False,
+    help='Render every post even if it has not changed.',
+    is_flag=True,
+)
+@click.option(
+    '--precompile-templates', 'precompile',
+    default=False,
+    help='Compile every template before freezing to find syntax errors.',
+    is_flag=True,
+)
+@click.option(
+    '--profile',
+    default=False,
+    help='Show the time spent on each stage, URL, and template.',
+    is_flag=True,
+)
+@click.option(
+    '--profile-top',
+    default=10,
+    help='Number of the slowest URLs and templates to show.',
+    show_default=True,
+    type=click.IntRange(min=0),
+)
+@click.option(
+    '--profile-json',
+    help='Write the profile as JSON to this file, implies --profile.',
+    type=click.Path(dir_okay=False, path_type=Path),
+)
+def build(  # noqa: PLR0913
     ctx: click.Context,
     *,
     minify_css: bool,
     minify_js: bool,
+    fingerprint: bool,
+    jobs: int,
+    full: bool,
+    precompile: bool,
+    profile: bool,
+    profile_top: int,
+    profile_json: Path | None,
 ) -> None:
-    app = site.create_app(minify_css=minify_css, minify_js=minify_js)
+    build_profile = BuildProfile() if profile or profile_json else None
+
+    def stage(name: str) -> contextlib.AbstractContextManager[None]:
+        if build_profile is None:
+            return contextlib.nullcontext()
+        return build_profile.stage(name)
+
+    with stage('create_app'):
+        app = site.create_app(
+            minify_css=minify_css,
+            minify_js=minify_js,
+            fingerprint=fingerprint,
+            jobs=jobs,
+        )
+    if build_profile:
+        build_profile.connect(app)
     ctx.ensure_object(dict)
     ctx.obj['flask_app'] = app
-    ctx.invoke(verify)
+    with stage('verify'):
+        ctx.invoke(verify, jobs=jobs)
     # If verify fails sys.exit(1) will run
 
-    sync_posts(app)
+    with stage('sync_posts'):
+        sync_posts(app, jobs=jobs)
+
+    if precompile:
+        with stage('precompile_templates'):
+            check_templates(app, jobs)
+
+    search_config = get_search_config(app)
+    search_digests = SearchIndexDigests(
+        Path(app.config['CACHE_FOLDER']),
+        search_config,
+    )
+    with stage('freeze'):
+        freeze(app, jobs=jobs, full=full, profile=build_profile)
 
+    # If pretty is true, minify is not checked
+    if app.config['MINIFY_HTML'] and not app.config['PRETTY_HTML']:
+        with stage('minify_html'):
+            minify_html_files(app, jobs)
+
+    with stage('pagefind'):
+        run_pagefind(app, search_config, search_digests)
+
+    with stage('prune_caches'):
+        prune_html_cache(app)
+        prune_encrypted_cache(app)
+
+    build_dir = app.config.get('FREEZER_DESTINATION')
+    msg = f'Static site was created in {build_dir}'
+    click.secho(msg, fg='green')
+
+    if build_profile:
+        build_profile.disconnect(app)
+        show_profile(build_profile, profile_top, profile_json)
+
+
+def show_profile(
+    build_profile: BuildProfile,
+    profile_top: int,
+    profile_json: Path | None,
+) -> None:
+    for line in build_profile.report(profile_top):
+        click.echo(line)
+    if profile_json:
+        build_profile.save(profile_json)
+
+
+def freeze(
+    app: Flask,
+    *,
+    jobs: int,
+    full: bool,
+    profile: BuildProfile | None,
+) -> None:
     freezer = site.freezer
+    manifest = BuildManifest(app, full=full)
+    freezer.manifest = manifest
+    freezer.profile = profile
     try:
-        freezer.freeze()
+        if jobs > 1:
+            freezer.freeze_parallel(jobs)
+        else:
+            freezer.freeze()
     except ValueError as exc:
         send_stderr(str(exc))
         sys.exit(1)
+    finally:
+        freezer.manifest = None
+        freezer.profile = None
+    manifest.save()
 
-    build_dir = app.config.get('FREEZER_DESTINATION')
-    pagefind_dir = app.config.get('PAGEFIND_OUTPUT', 'pagefind')
-    output = build_dir / pagefind_dir
-    exclude = pagefind_dir = app.config['PAGEFIND_EXCLUDE_SELECTORS']
-    keep_index_url = app.config['PAGEFIND_KEEP_INDEX_URL']
+
+def check_templates(app: Flask, jobs: int) -> None:
+    """Compile every template and exit if a template has a syntax error."""
+    errors = precompile_templates(app, jobs)
+    for error in errors:
+        send_stderr(error)
+    if errors:
+        sys.exit(1)
+
+
+def get_search_config(app: Flask) -> IndexConfig:
+    build_dir = Path(app.config['FREEZER_DESTINATION'])
+    return IndexConfig(
+        exclude_selectors=app.config['PAGEFIND_EXCLUDE_SELECTORS'],
+        keep_index_url=bool(app.config['PAGEFIND_KEEP_INDEX_URL']),
+        output_path=str(build_dir / app.config['PAGEFIND_OUTPUT']),
+    )
+
+
+def run_pagefind(
+    app: Flask,
+    search_config: IndexConfig,
+    search_digests: SearchIndexDigests,
+) -> None:
+    build_dir = Path(app.config['FREEZER_DESTINATION'])
+    output = search_digests.output
+    exclude = search_config.get('exclude_selectors') or []
     cmd = [
         sys.executable, '-m', 'pagefind',
         '--site', str(build_dir),
@@ -66,14 +231,18 @@ def build(
         '--exclude-selectors', ','.join(exclude),
     ]
 
-    if keep_index_url:
+    if search_config.get('keep_index_url'):
         cmd.append('--keep-index-url')
 
+    click.secho('Running Pagefind indexing...', fg='cyan')
+    pages = get_site_digests(build_dir, output)
+    if search_digests.previous and pages == search_digests.previous:
+        # The index from the last build has the same pages
+        return
+    remove_index(output)
     try:
-        click.secho('Running Pagefind indexing...', fg='cyan')
         subprocess.run(cmd, check=True, capture_output=True, text=True)  # noqa: S603
     except subprocess.CalledProcessError as e:  # pragma: no cover
         click.secho(f'Pagefind failed: {e.stderr}', fg='red', err=True)
-
-    msg = f'Static site was created in {build_dir}'
-    click.secho(msg, fg='green')
+    else:
+        search_digests.save(pages)
@@ -29,13 +29,13 @@ from watchdog.observers import Observer
 from werkzeug.serving import BaseWSGIServer, make_server
 
 from .. import site
+from ..password_protect import KeyPool
+from ..site.fragment_cache import clear_fragment_cache
 from ..utils import (
     get_post_hash,
     get_static_files,
-    minify_css_file,
-    minify_css_files,
-    minify_js_file,
-    minify_js_files,
+    minify_static_file,
+    minify_static_files,
     sync_posts,
     validate_post,
 )
@@ -168,11 +168,13 @@ class StaticHandler(BaseHandler):
         static_directory: Path,
         minify_css_dir: Path | None,
         minify_js_dir: Path | None,
+        cache_folder: Path | None = None,
     ) -> None:
         super().__init__(event, ('.css', '.js'))
         self.static_directory = static_directory
         self.minify_css_dir = minify_css_dir
         self.minify_js_dir = minify_js_dir
+        self.cache_folder = cache_folder
 
     @typing.override
     def handle_file(
@@ -206,10 +208,12 @@ class StaticHandler(BaseHandler):
                 click.echo(f'Source deleted. Removed minified file: {minify_path.name}')
             return
 
-        if file_path.suffix == '.css':
-            minify_css_file(self.static_directory, file_path, target_dir)
-        else:
-            minify_js_file(self.static_directory, file_path, target_dir)
+        minify_static_file(
+            self.static_directory,
+            file_path,
+            target_dir,
+            cache_folder=self.cache_folder,
+        )
 
         self.event.set()
         click.echo(f'Changes in {file_path.name}. Updated {minify_path.name}')
@@ -220,29 +224,29 @@ class PostHandler(BaseHandler):
         self,
         event: threading.Event,
         app: Flask,
+        key_pool: KeyPool | None = None,
     ) -> None:
         super().__init__(event, ('.md',))
         self.app = app
+        self.key_pool = key_pool
 
     @typing.override
     def get_file_hash(self, file_path: Path) -> str:
         posts = site.posts.get_posts(self.app)
         posts.reload()
-        sync_posts(self.app)
+        sync_posts(self.app, key_pool=self.key_pool)
         post = posts.get(file_path.stem)
         if not post:  # pragma: no cover
             msg = f'Post {file_path.stem} does not exist'
             raise FileNotFoundError(msg)
-        with self.app.app_context():
-            post_hash = get_post_hash(post)
-        return post_hash
+        return get_post_hash(post)
 
     @typing.override
     def handle_file(self, file_path: Path, event_type: str) -> None:
         if event_type == 'deleted':
             posts = site.posts.get_posts(self.app)
             posts.reload()
-            sync_posts(self.app)
+            sync_posts(self.app, key_pool=self.key_pool)
             self.event.set()
             click.echo(f'Post {event_type} {file_path.name}.')
             return
@@ -266,15 +270,17 @@ class TemplateHandler(BaseHandler):
     @typing.override
     def handle_file(self, file_path: Path, event_type: str) -> None:
         self.app.jinja_env.cache.clear()  # type: ignore[union-attr]
+        clear_fragment_cache(self.app)
         self.event.set()
         click.echo(f'Template {event_type} {file_path.name}.')
 
 
-def watch_disk(
+def watch_disk(  # noqa: PLR0915
     exit_event: threading.Event,
     start_event: threading.Event,
     refresh_event: threading.Event,
     app: Flask,
+    jobs: int = 1,
 ) -> None:
     """
     Watch static and posts folders for changes.
@@ -289,6 +295,7 @@ def watch_disk(
         start_event: Event to signal thread has started.
         refresh_event: Event to signal browser refresh.
         app: Flask application instance.
+        jobs: Number of processes generating passwords.
 
     """
     minify_css = app.config['MINIFY_CSS']
@@ -304,19 +311,24 @@ def watch_disk(
     else:
         minify_js_dir = None
 
+    cache_folder = Path(app.config['CACHE_FOLDER'])
     posts_path = app.config['FLATPAGES_ROOT']
     template_path = Path(app.config['TEMPLATE_FOLDER'])
 
     observer = Observer()
     observer.daemon = True
+    # Passwords are generated ahead of time so new protected posts do not wait
+    key_pool = KeyPool(jobs, size=jobs)
 
     try:
+        key_pool.start()
         if static_directory.exists():
             static_handler = StaticHandler(
                 refresh_event,
                 static_directory,
                 minify_css_dir,
                 minify_js_dir,
+                cache_folder,
             )
             observer.schedule(
                 static_handler,
@@ -326,6 +338,7 @@ def watch_disk(
         posts_handler = PostHandler(
             refresh_event,
             app,
+            key_pool,
         )
         observer.schedule(
             posts_handler,
@@ -344,13 +357,24 @@ def watch_disk(
         # Ensure everything is current now that watchdogs are running
         posts = site.posts.get_posts(app)
         posts.reload()
-        sync_posts(app)
+        sync_posts(app, key_pool=key_pool)
+        # Only files changed since create_app() are minified and written
         if minify_css:
             files_css = get_static_files(static_directory, '.css')
-            minify_css_files(static_directory, files_css, minify_css_dir)
+            minify_static_files(
+                static_directory,
+                files_css,
+                minify_css_dir,
+                cache_folder=cache_folder,
+            )
         if minify_js:
             files_js = get_static_files(static_directory, '.js')
-            minify_js_files(static_directory, files_js, minify_js_dir)
+            minify_static_files(
+                static_directory,
+                files_js,
+                minify_js_dir,
+                cache_folder=cache_folder,
+            )
         start_event.set()
 
         while not exit_event.is_set():
@@ -363,6 +387,7 @@ def watch_disk(
             observer.join(timeout=0.2)
         with contextlib.suppress(Exception):
             observer.unschedule_all()
+        key_pool.close()
 
 
 def create_webserver(
@@ -438,13 +463,21 @@ def exit_if_parent_pid_changes() -> None:
     default=None,
     help='Alias for --minify-js/--no-minify-js',
 )
-def preview(
+@click.option(
+    '--jobs', '-j',
+    default=os.cpu_count() or 1,
+    help='Number of processes used to generate passwords.',
+    show_default='CPU count',
+    type=click.IntRange(min=1),
+)
+def preview(  # noqa: PLR0913
     host: str,
     port: int,
     *,
     drafts: bool,
     minify_css: bool,
     minify_js: bool,
+    jobs: int,
 ) -> None:
     stop_event = create_stop_event()
     set_stop_event_on_signal(stop_event)
@@ -469,6 +502,7 @@ def preview(
             watch_thread_started,
             refresh_event,
             app,
+            jobs,
         ),
         daemon=True,
     )
@@ -1,35 +1,213 @@
+from concurrent.futures import ProcessPoolExecutor
+import hashlib
+from importlib.metadata import version
+import itertools
+import json
+import multiprocessing
+from pathlib import Path
 import sys
+import typing
 
 import click
 from flask import Flask
 
 from .. import site
 from ..constants import CONFIG_FILE
-from ..utils import validate_post
+from ..utils import atomic_write, get_post_errors, send_stderr
+
+
+VERIFY_FILE = 'verify.json'
+
+# post path -> error messages
+PostErrors = dict[str, list[str]]
+
+
+class VerifyCache:
+    """
+    Remember the errors of each post file from the last verify.
+
+    A post is only validated again when the size, modification time,
+    and contents of its file have changed.
+    """
+
+    def __init__(self, app: Flask, required_fields: list[str]) -> None:
+        self.app = app
+        self.path = Path(app.config['CACHE_FOLDER']) / VERIFY_FILE
+        options = [version('htmd'), *required_fields]
+        self.options = hashlib.sha256('\0'.join(options).encode('utf-8')).hexdigest()
+        self.previous: dict[str, dict[str, typing.Any]] = self._load()
+        self.posts: dict[str, dict[str, typing.Any]] = {}
+
+    def _load(self) -> dict[str, dict[str, typing.Any]]:
+        try:
+            data = json.loads(self.path.read_text())
+        except (FileNotFoundError, json.JSONDecodeError):
+            return {}
+        if data.get('options') != self.options:
+            return {}
+        posts: dict[str, dict[str, typing.Any]] = data.get('posts', {})
+        return posts
+
+    def _file_path(self, post_path: str) -> Path:
+        post_folder = Path(self.app.config['FLATPAGES_ROOT'])
+        file_extension = self.app.config['FLATPAGES_EXTENSION']
+        return post_folder / f'{post_path}{file_extension}'
+
+    def cached_errors(self, post_path: str) -> list[str] | None:
+        """
+        Return the errors from the last verify if the post file has not changed.
+
+        None is returned when the post needs to be validated.
+        """
+        stat = self._file_path(post_path).stat()
+        entry = self.previous.get(post_path)
+        if entry is None or entry['size'] != stat.st_size:
+            return None
+        if entry['mtime_ns'] == stat.st_mtime_ns:
+            self.posts[post_path] = entry
+            return list(entry['errors'])
+        file_hash = hashlib.sha256(self._file_path(post_path).read_bytes()).hexdigest()
+        if entry['hash'] != file_hash:
+            return None
+        # Only the modification time changed
+        self.posts[post_path] = {**entry, 'mtime_ns': stat.st_mtime_ns}
+        return list(entry['errors'])
+
+    def record(self, post_path: str, errors: list[str]) -> None:
+        file_path = self._file_path(post_path)
+        stat = file_path.stat()
+        self.posts[post_path] = {
+            'size': stat.st_size,
+            'mtime_ns': stat.st_mtime_ns,
+            'hash': hashlib.sha256(file_path.read_bytes()).hexdigest(),
+            'errors': errors,
+        }
+
+    def save(self) -> None:
+        data = {
+            'options': self.options,
+            'posts': self.posts,
+        }
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        atomic_write(self.path, json.dumps(data))
+
+
+_worker_app: Flask | None = None
+_worker_required_fields: list[str] = []
+
+
+def _init_worker(app: Flask, required_fields: list[str]) -> None:  # pragma: no cover
+    # Runs in worker processes.
+    # The app is forked so posts do not need to be loaded again.
+    global _worker_app, _worker_required_fields  # noqa: PLW0603
+    _worker_app = app
+    _worker_required_fields = required_fields
+
+
+def _validate_posts(post_paths: list[str]) -> PostErrors:  # pragma: no cover
+    # Runs in worker processes.
+    assert _worker_app is not None
+    posts = site.posts.get_posts(_worker_app)
+    errors = {}
+    for post_path in post_paths:
+        post = posts.get(post_path)
+        assert post is not None
+        errors[post_path] = get_post_errors(post, _worker_required_fields)
+    return errors
+
+
+def validate_posts(
+    app: Flask,
+    post_paths: list[str],
+    required_fields: list[str],
+    jobs: int,
+) -> PostErrors:
+    """Validate posts in `jobs` processes."""
+    if jobs == 1:
+        posts = site.posts.get_posts(app)
+        errors = {}
+        for post_path in post_paths:
+            post = posts.get(post_path)
+            assert post is not None
+            errors[post_path] = get_post_errors(post, required_fields)
+        return errors
+
+    chunk_size = max(1, len(post_paths) // (jobs * 4))
+    chunks = itertools.batched(post_paths, chunk_size, strict=False)
+    context = multiprocessing.get_context('fork')
+    with ProcessPoolExecutor(
+        jobs,
+        mp_context=context,
+        initializer=_init_worker,
+        initargs=(app, required_fields),
+    ) as executor:
+        errors = {}
+        for chunk_errors in executor.map(_validate_posts, map(list, chunks)):
+            errors.update(chunk_errors)
+    return errors
+
+
+def get_errors(app: Flask, required_fields: list[str], jobs: int) -> PostErrors:
+    """Return the errors of every post, only validating posts that changed."""
+    posts = site.posts.get_posts(app)
+    cache = VerifyCache(app, required_fields)
+
+    errors: PostErrors = {}
+    changed = []
+    for post in posts:
+        post_errors = cache.cached_errors(post.path)
+        if post_errors is None:
+            changed.append(post.path)
+        else:
+            errors[post.path] = post_errors
+    new_errors = validate_posts(app, changed, required_fields, jobs)
+    for post_path, post_errors in new_errors.items():
+        cache.record(post_path, post_errors)
+    errors.update(new_errors)
+    cache.save()
+    return errors
 
 
 @click.command('verify', short_help='Verify posts formatting is correct.')
 @click.pass_context
-def verify(ctx: click.Context) -> Flask:
+@click.option(
+    '--jobs', '-j',
+    default=1,
+    help='Number of processes used to validate posts.',
+    show_default=True,
+    type=click.IntRange(min=1),
+)
+@click.option(
+    '--report',
+    help='Write the errors of each post as JSON to this file.',
+    type=click.Path(dir_okay=False, path_type=Path),
+)
+def verify(ctx: click.Context, *, jobs: int, report: Path | None) -> Flask:
     ctx.ensure_object(dict)
     app: Flask | None = ctx.obj.get('flask_app')
     if app is None:
-        app = site.create_app()
+        # Posts are loaded with the config of the site,
+        # static files are not used
+        app = site.create_app(minify_css=False, minify_js=False)
 
-    correct = True
     required_fields = ['title']
     # Only check author if there is no default
     if not app.config.get('DEFAULT_AUTHOR'):
         required_fields.append('author')
-    posts = site.posts.get_posts(app)
-    for post in posts:
-        if not validate_post(post, required_fields):
-            correct = False
-            break
-    else:
+    errors = get_errors(app, required_fields, jobs)
+
+    invalid = {path: errors[path] for path in sorted(errors) if errors[path]}
+    for post_errors in invalid.values():
+        for msg in post_errors:
+            send_stderr(msg)
+    if not invalid:
         msg = 'All posts are correctly formatted.'
         click.secho(msg, fg='green')
 
+    if report:
+        data = {'posts': len(errors), 'errors': invalid}
+        report.write_text(json.dumps(data, indent=2))
+
     # Check if SITE_NAME exists
     site_name = app.config.get('SITE_NAME')
     if not site_name:
@@ -37,6 +215,6 @@ def verify(ctx: click.Context) -> Flask:
         message = f'[site] name is not set in {CONFIG_FILE}.'
         click.secho(message, fg='yellow', err=True)
 
-    if not correct:
+    if invalid:
         sys.exit(1)
     return app
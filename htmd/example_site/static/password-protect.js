@@ -30,20 +30,40 @@ async function importPrivateKey(pem_base64) {
   return ret;
 }
 
-async function decrypt(ciphertext, privateKey) {
-  const decodedCiphertext = atob(ciphertext);
-  const ciphertextArrayBuffer = new Uint8Array(decodedCiphertext.length).buffer;
-  const ciphertextUint8Array = new Uint8Array(ciphertextArrayBuffer);
-  for (let i = 0; i < decodedCiphertext.length; i++) {
-    ciphertextUint8Array[i] = decodedCiphertext.charCodeAt(i);
-  }
+function base64ToBytes(text) {
+  return new Uint8Array(str2ab(window.atob(text)));
+}
 
-  const decrypted = await window.crypto.subtle.decrypt(
+async function importContentKey(wrappedKey, privateKey) {
+  // Only the AES-GCM content key is encrypted with RSA-OAEP
+  const rawKey = await window.crypto.subtle.decrypt(
     {
       name: "RSA-OAEP",
     },
     privateKey,
-    ciphertextUint8Array
+    wrappedKey,
+  );
+  return await window.crypto.subtle.importKey(
+    "raw",
+    rawKey,
+    {
+      name: "AES-GCM",
+    },
+    false,
+    ["decrypt"],
+  );
+}
+
+async function decrypt(cipherBytes, contentKey, field) {
+  // 12 byte nonce followed by the ciphertext and tag
+  const decrypted = await window.crypto.subtle.decrypt(
+    {
+      name: "AES-GCM",
+      iv: cipherBytes.subarray(0, 12),
+      additionalData: new TextEncoder().encode(field),
+    },
+    contentKey,
+    cipherBytes.subarray(12),
   );
 
   return new TextDecoder().decode(decrypted);
@@ -57,16 +77,36 @@ async function decryptPost(
 ) {
   const privateKey = await importPrivateKey(pemEncodedPrivateKey);
   try {
-    const decryptedHTML = await decrypt(cipherHTML, privateKey);
+    // The encrypted content key is before the encrypted HTML
+    const htmlBytes = base64ToBytes(cipherHTML);
+    const keyLength = privateKey.algorithm.modulusLength / 8;
+    const contentKey = await importContentKey(
+      htmlBytes.subarray(0, keyLength),
+      privateKey,
+    );
+
+    const decryptedHTML = await decrypt(
+      htmlBytes.subarray(keyLength),
+      contentKey,
+      "html",
+    );
     const contentDiv = document.getElementById('post-content');
     contentDiv.innerHTML = decryptedHTML;
 
-    const decryptedTitle = await decrypt(cipherTitle, privateKey);
+    const decryptedTitle = await decrypt(
+      base64ToBytes(cipherTitle),
+      contentKey,
+      "title",
+    );
     const titleSpan = document.getElementById('post-title');
     titleSpan.textContent = decryptedTitle;
     document.title = decryptedTitle + ' ' + document.title;
 
-    const decryptedSubtitle = await decrypt(cipherSubtitle, privateKey);
+    const decryptedSubtitle = await decrypt(
+      base64ToBytes(cipherSubtitle),
+      contentKey,
+      "subtitle",
+    );
     const subtitleSpan = document.getElementById('post-subtitle');
     subtitleSpan.textContent = decryptedSubtitle;
   } catch (e) {
@@ -7,13 +7,26 @@ from urllib.parse import urlparse
 from flask import current_app, Flask, send_from_directory
 from flask.typing import ResponseReturnValue
 from jinja2 import ChoiceLoader, FileSystemLoader
+from pygments.styles import get_all_styles
 
 from ..constants import CONFIG_FILE
-from ..utils import get_static_files, minify_css_files, minify_js_files
+from ..utils import get_static_files, minify_static_files, prune_minified_cache
+from .assets import (
+    asset_manifest,
+    ASSET_MANIFEST_URL,
+    AssetManifest,
+    ASSETS_EXTENSION,
+    fingerprint_static_url,
+    send_generated_asset,
+)
+from .encrypted_cache import cached_encrypt_post
+from .fragment_cache import set_fragment_cache
 from .freezer import freeze_bp, freezer
-from .main import create_redirect_view, main_bp
+from .html_cache import cached_markdown
+from .main import add_generated_assets, create_redirect_view, main_bp
 from .pages import pages
 from .posts import create_posts_blueprint
+from .template_cache import set_bytecode_cache
 
 
 def get_project_dir() -> Path:
@@ -32,6 +45,9 @@ def get_project_dir() -> Path:
 
 def custom_static(filename: str) -> ResponseReturnValue:
     assert current_app.static_folder is not None
+    generated = send_generated_asset(filename)
+    if generated is not None:
+        return generated
     suffix = Path(filename).suffix
     if suffix == '.css':
         directory = current_app.config.get('static_dir_css', current_app.static_folder)
@@ -42,6 +58,69 @@ def custom_static(filename: str) -> ResponseReturnValue:
     return send_from_directory(directory, filename)
 
 
+def init_assets(app: Flask) -> AssetManifest:
+    assets = AssetManifest()
+    add_generated_assets(assets, bundle=app.config['STATIC_BUNDLE'])
+    app.extensions[ASSETS_EXTENSION] = assets
+    app.url_defaults(fingerprint_static_url)
+    app.add_url_rule(
+        ASSET_MANIFEST_URL,
+        endpoint='asset_manifest',
+        view_func=asset_manifest,
+    )
+    return assets
+
+
+def minify_static(
+    app: Flask,
+    *,
+    minify_css: bool,
+    minify_js: bool,
+    assets: AssetManifest | None,
+    jobs: int,
+) -> tuple[list[str], list[str]]:
+    """
+    Minify the CSS and JavaScript files in the static folder.
+
+    Return FILES_CSS and FILES_JS.
+    """
+    assert app.static_folder is not None
+    static_src_root = Path(app.static_folder)
+    css_paths = get_static_files(static_src_root, '.css')
+    js_paths = get_static_files(static_src_root, '.js')
+    files_css = [str(path) for path in css_paths]
+    files_js = [str(path) for path in js_paths]
+    if not minify_css and not minify_js:
+        return files_css, files_js
+
+    static_source_dir = Path(app.config['FREEZER_DESTINATION']) / 'static'
+    static_source_dir.mkdir(parents=True, exist_ok=True)
+    if minify_css:
+        app.config['static_dir_css'] = static_source_dir
+    else:
+        css_paths = []
+    if minify_js:
+        app.config['static_dir_js'] = static_source_dir
+    else:
+        js_paths = []
+    # Minified together so changed CSS and JavaScript files use every process
+    cache_folder = Path(app.config['CACHE_FOLDER'])
+    minified_files = minify_static_files(
+        static_src_root,
+        [*css_paths, *js_paths],
+        static_source_dir,
+        assets,
+        cache_folder=cache_folder,
+        jobs=jobs,
+    )
+    prune_minified_cache(cache_folder, [*css_paths, *js_paths])
+    if minify_css:
+        files_css = minified_files[:len(css_paths)]
+    if minify_js:
+        files_js = minified_files[len(css_paths):]
+    return files_css, files_js
+
+
 def toml_config_get(
     cfg: dict[str, typing.Any],
     section: str,
@@ -62,6 +141,8 @@ def create_app(  # noqa: PLR0915
     show_drafts: bool = False,
     minify_css: bool = True,
     minify_js: bool = True,
+    fingerprint: bool = False,
+    jobs: int = 1,
 ) -> Flask:
     this_dir = Path(__file__).parent
     app = Flask(
@@ -94,6 +175,7 @@ def create_app(  # noqa: PLR0915
         'FACEBOOK_APP_ID': ('site', 'facebook_app_id', ''),
 
         'BUILD_FOLDER': ('folders', 'build', 'build'),
+        'CACHE_FOLDER': ('folders', 'cache', '.htmd-cache'),
         'PAGES_FOLDER': ('folders', 'pages', 'pages'),
         'POSTS_FOLDER': ('folders', 'posts', 'posts'),
         'STATIC_FOLDER': ('folders', 'static', 'static'),
@@ -102,6 +184,8 @@ def create_app(  # noqa: PLR0915
         'PRETTY_HTML': ('html', 'pretty', False),
         'MINIFY_HTML': ('html', 'minify', False),
 
+        'STATIC_BUNDLE': ('static', 'bundle', False),
+
         'POSTS_FEED_FULL_TEXT': ('posts.feed', 'full_text', True),
         'POSTS_FEED_TRUNCATE_LIMIT': ('posts.feed', 'truncate_limit', 255),
 
@@ -119,6 +203,7 @@ def create_app(  # noqa: PLR0915
         'RANDOM_POST_ENABLED': ('posts.discovery', 'random_post_enabled', False),
 
         'FLATPAGES_MARKDOWN_EXTENSIONS': ('posts.markdown', 'extensions', None),
+        'PYGMENTS_STYLE': ('posts.markdown', 'pygments_style', 'tango'),
 
         'PAGEFIND_OUTPUT': ('pagefind', 'output', 'pagefind'),
         'PAGEFIND_EXCLUDE_SELECTORS': (
@@ -133,6 +218,11 @@ def create_app(  # noqa: PLR0915
     for flask_key, (table, key, default) in config_keys.items():
         app.config[flask_key] = toml_config_get(htmd_config, table, key, default)
 
+    pygments_style = app.config['PYGMENTS_STYLE']
+    if pygments_style not in get_all_styles():
+        msg = f'Pygments style {pygments_style} does not exist'
+        sys.exit(msg)
+
     site_url = app.config['SITE_URL']
     app.config['FREEZER_BASE_URL'] = site_url
     if site_url.startswith('http'):
@@ -150,48 +240,49 @@ def create_app(  # noqa: PLR0915
     app.config['FREEZER_DESTINATION'] = (
         project_dir / app.config['BUILD_FOLDER']
     )
+    app.config['PROJECT_DIR'] = project_dir
+    app.config['CACHE_FOLDER'] = project_dir / app.config['CACHE_FOLDER']
     app.config['FREEZER_REMOVE_EXTRA_FILES'] = True
     custom_ignores = toml_config_get(htmd_config, 'build', 'keep_files', [])
     # Allow build to be version controlled
-    app.config['FREEZER_DESTINATION_IGNORE'] = ['.git*', '.hg*', *custom_ignores]
+    # The search index is kept until a page changes
+    app.config['FREEZER_DESTINATION_IGNORE'] = [
+        '.git*',
+        '.hg*',
+        f"{app.config['PAGEFIND_OUTPUT']}/",
+        *custom_ignores,
+    ]
     app.config['FREEZER_STATIC_IGNORE'] = ['*.css', '*.js']
     app.config['FLATPAGES_EXTENSION'] = app.config['POSTS_EXTENSION']
+    # Skip rendering markdown that was rendered in a previous run
+    app.config['FLATPAGES_HTML_RENDERER'] = cached_markdown
+    # Skip encrypting protected posts that were encrypted in a previous run
+    app.config['ENCRYPT_POST'] = cached_encrypt_post
 
     # Without clearing the cache tests will use templates from the first test
     # Even when the template folder and jinja_loader has changed
     app.jinja_env.cache = {}
+    # Compiled templates are shared between processes and runs
+    set_bytecode_cache(app)
+    # {% cache %} blocks, used by _list.html to render each post preview once
+    set_fragment_cache(app)
 
     # Allow config settings (even new user created ones)
     # to be used in templates
     for key in app.config:
         app.jinja_env.globals[key] = app.config[key]
 
-    static_src_root = Path(app.static_folder)
-    css_paths = get_static_files(static_src_root, '.css')
-    if minify_css:
-        static_source_dir = project_dir / app.config['BUILD_FOLDER'] / 'static'
-        static_source_dir.mkdir(parents=True, exist_ok=True)
-        app.config['static_dir_css'] = static_source_dir
-        files_css = minify_css_files(
-            static_src_root,
-            css_paths,
-            static_source_dir,
-        )
-    else:
-        files_css = [str(path) for path in css_paths]
+    # Content hashes in the names of minified and generated static files
+    assets = init_assets(app) if fingerprint else None
 
-    js_paths = get_static_files(static_src_root, '.js')
-    if minify_js:
-        static_source_dir = project_dir / app.config['BUILD_FOLDER'] / 'static'
-        static_source_dir.mkdir(parents=True, exist_ok=True)
-        app.config['static_dir_js'] = static_source_dir
-        files_js = minify_js_files(
-            static_src_root,
-            js_paths,
-            static_source_dir,
-        )
-    else:
-        files_js = [str(path) for path in js_paths]
+    static_src_root = Path(app.static_folder)
+    files_css, files_js = minify_static(
+        app,
+        minify_css=minify_css,
+        minify_js=minify_js,
+        assets=assets,
+        jobs=jobs,
+    )
 
     favicon_path = static_src_root / 'favicon.svg'
 
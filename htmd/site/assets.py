@@ -0,0 +1,108 @@
+from collections.abc import Callable
+import hashlib
+import mimetypes
+from pathlib import PurePosixPath
+import typing
+
+from flask import current_app, make_response
+from flask.typing import ResponseReturnValue
+
+
+ASSETS_EXTENSION = 'htmd_assets'
+ASSET_MANIFEST_URL = '/static/asset-manifest.json'
+HASH_LENGTH = 10
+
+
+def fingerprint_name(name: str, content: bytes) -> str:
+    """
+    Add a hash of `content` to `name`.
+
+    The hash goes before the extension, or before .min and the extension,
+    style.min.css becomes style.<hash>.min.css.
+    """
+    digest = hashlib.sha256(content).hexdigest()[:HASH_LENGTH]
+    path = PurePosixPath(name)
+    extension = path.suffix
+    if path.stem.endswith('.min'):
+        extension = f'.min{extension}'
+    base = path.name.removesuffix(extension)
+    return path.with_name(f'{base}.{digest}{extension}').as_posix()
+
+
+class AssetManifest:
+    """
+    Map the names of static files to names with a hash of their contents.
+
+    Templates keep using the names,
+    url_for('static', filename=name) returns the URL of the fingerprinted file,
+    which can be cached forever because a change in the file changes its URL.
+    Generated files (like pygments.css) are hashed when a URL is created,
+    because their contents depend on the posts.
+    """
+
+    def __init__(self) -> None:
+        # name -> fingerprinted name
+        self.names: dict[str, str] = {}
+        # fingerprinted name -> name
+        self.logical_names: dict[str, str] = {}
+        self.generated: dict[str, Callable[[], str | bytes]] = {}
+
+    def add(self, name: str, content: bytes) -> str:
+        """Record the fingerprinted name of `name` and return it."""
+        fingerprinted = fingerprint_name(name, content)
+        self.names[name] = fingerprinted
+        self.logical_names[fingerprinted] = name
+        return fingerprinted
+
+    def add_generated(self, name: str, get_content: Callable[[], str | bytes]) -> None:
+        self.generated[name] = get_content
+
+    def get_generated(self, name: str) -> bytes:
+        content = self.generated[name]()
+        if isinstance(content, str):
+            return content.encode('utf-8')
+        return content
+
+    def url_name(self, name: str) -> str:
+        """Return the name to use in the URL of the static file `name`."""
+        if name in self.generated:
+            return self.add(name, self.get_generated(name))
+        return self.names.get(name, name)
+
+    def as_dict(self) -> dict[str, str]:
+        for name in self.generated:
+            self.url_name(name)
+        return dict(sorted(self.names.items()))
+
+
+def get_assets() -> AssetManifest | None:
+    assets: AssetManifest | None = current_app.extensions.get(ASSETS_EXTENSION)
+    return assets
+
+
+def fingerprint_static_url(endpoint: str, values: dict[str, typing.Any]) -> None:
+    """Make url_for('static', filename=name) use the fingerprinted name."""
+    if endpoint != 'static' or 'filename' not in values:
+        return
+    assets = get_assets()
+    if assets is not None:
+        values['filename'] = assets.url_name(values['filename'])
+
+
+def send_generated_asset(filename: str) -> ResponseReturnValue | None:
+    """Return the response for a fingerprinted generated file."""
+    assets = get_assets()
+    if assets is None:
+        return None
+    name = assets.logical_names.get(filename)
+    if name is None or name not in assets.generated:
+        return None
+    response = make_response(assets.get_generated(name))
+    response.mimetype = mimetypes.guess_type(name)[0] or 'text/plain'
+    return response
+
+
+def asset_manifest() -> ResponseReturnValue:
+    assets = get_assets()
+    assert assets is not None
+    return assets.as_dict()
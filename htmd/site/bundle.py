@@ -0,0 +1,68 @@
+from collections.abc import Iterable
+import functools
+from pathlib import Path
+import typing
+
+from flask import current_app
+
+from .assets import get_assets
+
+
+BUNDLE_CSS = 'bundle.css'
+BUNDLE_JS = 'bundle.js'
+HTMD_STATIC_FOLDER = Path(__file__).parent / '..' / 'example_site' / 'static'
+
+
+@functools.lru_cache(maxsize=256)
+def _read_text(path: Path, _mtime_ns: int) -> str:
+    return path.read_text()
+
+
+def read_text(path: Path) -> str:
+    """Read a static file, files that did not change are read once."""
+    return _read_text(path, path.stat().st_mtime_ns)
+
+
+def get_minified_paths(extension: str) -> list[Path]:
+    """
+    Return the paths of FILES_CSS or FILES_JS in the order of _layout.html.
+
+    The files are only linked, and bundled, when they are minified.
+    """
+    if not current_app.config[f'MINIFY_{extension.upper()}']:
+        return []
+    directory = Path(current_app.config[f'static_dir_{extension}'])
+    names = typing.cast(
+        'list[str]',
+        current_app.jinja_env.globals[f'FILES_{extension.upper()}'],
+    )
+    assets = get_assets()
+    if assets is not None:
+        names = [assets.names.get(name, name) for name in names]
+    return [directory / name for name in names]
+
+
+def join_css(parts: Iterable[str]) -> str:
+    return ''.join(f'{part.strip()}\n' for part in parts if part.strip())
+
+
+def join_js(parts: Iterable[str]) -> str:
+    # A file without a semicolon at the end would continue in the next file
+    return ''.join(f'{part.strip()}\n;\n' for part in parts if part.strip())
+
+
+def get_css_bundle(pygments_css: str) -> str:
+    """Join htmd.css, FILES_CSS, and pygments.css in that order."""
+    return join_css([
+        read_text(HTMD_STATIC_FOLDER / 'htmd.css'),
+        *(read_text(path) for path in get_minified_paths('css')),
+        pygments_css,
+    ])
+
+
+def get_js_bundle() -> str:
+    """Join htmd.js and FILES_JS in that order."""
+    return join_js([
+        read_text(HTMD_STATIC_FOLDER / 'htmd.js'),
+        *(read_text(path) for path in get_minified_paths('js')),
+    ])
@@ -0,0 +1,88 @@
+import hashlib
+import json
+from pathlib import Path
+
+from flask import current_app, Flask
+from flask_flatpages import FlatPages, Page
+
+from ..password_protect import encrypt_post
+from ..utils import atomic_write, prune_cache
+from .html_cache import get_html_key
+from .posts import get_posts
+
+
+ENCRYPTED_CACHE_FOLDER = 'encrypted'
+
+# encrypted HTML, title, and subtitle
+EncryptedPost = tuple[str, str, str]
+
+_encrypted_posts: dict[str, EncryptedPost] = {}
+
+
+def get_key_fingerprint(password: str) -> str:
+    return hashlib.sha256(password.strip().encode('utf-8')).hexdigest()
+
+
+def get_encrypted_key(post: Page, flatpages: FlatPages) -> str:
+    """
+    Hash everything that changes the encrypted fields of a post.
+
+    The HTML key is used instead of `_hash`
+    since drafts do not have `_hash` and the subtitle is not part of it.
+    """
+    fields = (
+        get_html_key(post.body, flatpages),
+        post.meta['title'],
+        post.meta.get('subtitle') or '',
+        get_key_fingerprint(post.meta['password']),
+    )
+    hash_obj = hashlib.sha256()
+    for field in fields:
+        hash_obj.update(str(field).encode('utf-8'))
+        hash_obj.update(b'\x00')
+    return hash_obj.hexdigest()
+
+
+def get_encrypted_path(cache_folder: Path, key: str) -> Path:
+    return cache_folder / ENCRYPTED_CACHE_FOLDER / key[:2] / f'{key}.json'
+
+
+def cached_encrypt_post(post: Page, flatpages: FlatPages) -> EncryptedPost:
+    """
+    Encrypt a password protected post using the result of a previous run.
+
+    The encrypted fields are kept in memory and in CACHE_FOLDER,
+    so an unchanged post is only encrypted once.
+    """
+    key = get_encrypted_key(post, flatpages)
+    if key in _encrypted_posts:
+        return _encrypted_posts[key]
+
+    cache_folder = Path(current_app.config['CACHE_FOLDER'])
+    encrypted_path = get_encrypted_path(cache_folder, key)
+    try:
+        html, title, subtitle = json.loads(encrypted_path.read_text())
+    except FileNotFoundError:
+        html, title, subtitle = encrypt_post(
+            post.html,
+            post.meta['title'],
+            post.meta.get('subtitle'),
+            post.meta['password'],
+        )
+        encrypted_path.parent.mkdir(parents=True, exist_ok=True)
+        atomic_write(encrypted_path, json.dumps([html, title, subtitle]))
+    _encrypted_posts[key] = (html, title, subtitle)
+    return _encrypted_posts[key]
+
+
+def prune_encrypted_cache(app: Flask) -> None:
+    """Remove the encrypted fields of posts that changed or are not protected."""
+    cache_folder = Path(app.config['CACHE_FOLDER'])
+    posts = get_posts(app)
+    with app.app_context():
+        used = [
+            get_encrypted_path(cache_folder, get_encrypted_key(post, posts))
+            for post in posts
+            if post.meta.get('password')
+        ]
+    prune_cache(cache_folder / ENCRYPTED_CACHE_FOLDER, used)
@@ -0,0 +1,87 @@
+from collections import OrderedDict
+import hashlib
+import typing
+
+from flask import Flask
+from jinja2 import Environment, nodes
+from jinja2.ext import Extension
+from jinja2.parser import Parser
+
+from .manifest import get_cached_post_digest
+
+
+# The least recently used fragment is removed when the cache has this many
+MAX_FRAGMENTS = 10_000
+
+
+class FragmentCacheExtension(Extension):
+    """
+    Render the body of `{% cache key, ... %}...{% endcache %}` once for each key.
+
+    The template name, a hash of its source, and the line are part of the key,
+    so the same values can be used by different cache blocks
+    and a changed template does not use the fragments of the old one.
+    Fragments are kept until clear_fragment_cache() is called,
+    or until MAX_FRAGMENTS newer fragments have been used.
+    """
+
+    # Jinja reads the tags from the class
+    tags = {'cache'}  # noqa: RUF012
+
+    def __init__(self, environment: Environment) -> None:
+        super().__init__(environment)
+        self.fragments: OrderedDict[typing.Hashable, str] = OrderedDict()
+        # template name -> hash of the source being compiled
+        self._source_digests: dict[str | None, str] = {}
+
+    def preprocess(
+        self,
+        source: str,
+        name: str | None,
+        filename: str | None = None,  # noqa: ARG002
+    ) -> str:
+        digest = hashlib.sha256(source.encode('utf-8')).hexdigest()
+        self._source_digests[name] = digest
+        return source
+
+    def parse(self, parser: Parser) -> nodes.Node:
+        lineno = next(parser.stream).lineno
+        key = nodes.Tuple(
+            [
+                nodes.Const(parser.name),
+                nodes.Const(self._source_digests.get(parser.name)),
+                nodes.Const(lineno),
+                parser.parse_tuple(),
+            ],
+            'load',
+        )
+        body = parser.parse_statements(('name:endcache',), drop_needle=True)
+        call = self.call_method('_cached_fragment', [key])
+        return nodes.CallBlock(call, [], [], body).set_lineno(lineno)
+
+    def _cached_fragment(
+        self,
+        key: typing.Hashable,
+        caller: typing.Callable[[], str],
+    ) -> str:
+        fragment = self.fragments.get(key)
+        if fragment is not None:
+            self.fragments.move_to_end(key)
+            return fragment
+        if len(self.fragments) >= MAX_FRAGMENTS:
+            self.fragments.popitem(last=False)
+        fragment = caller()
+        self.fragments[key] = fragment
+        return fragment
+
+
+def set_fragment_cache(app: Flask) -> None:
+    app.jinja_env.add_extension(FragmentCacheExtension)
+    # A key for posts in cache blocks that changes when the post changes
+    app.jinja_env.globals['post_digest'] = get_cached_post_digest
+
+
+def clear_fragment_cache(app: Flask) -> None:
+    extension = app.jinja_env.extensions[FragmentCacheExtension.identifier]
+    assert isinstance(extension, FragmentCacheExtension)
+    extension.fragments.clear()
@@ -1,20 +1,182 @@
 from collections.abc import Iterable, Iterator
+from concurrent.futures import FIRST_COMPLETED, Future, ProcessPoolExecutor, wait
+import contextlib
+import datetime as dt
+import itertools
+import multiprocessing
 from pathlib import Path
+import typing
+from unicodedata import normalize
 
 from flask import Blueprint, current_app, render_template
 from flask.typing import ResponseReturnValue
-from flask_frozen import Freezer
+from flask_frozen import Freezer, walk_directory
 
+from .assets import ASSET_MANIFEST_URL, ASSETS_EXTENSION
+from .manifest import BuildManifest
 from .pages import pages
 from .posts import get_posts
+from .profiler import BuildProfile, Timings
 
 
-freezer = Freezer(
+# (path relative to build, URLs linked from the page, manifest entry,
+#  URL and template timings when profiling)
+FrozenURL = tuple[
+    str,
+    list[tuple[str, str | None]],
+    dict[str, typing.Any] | None,
+    tuple[Timings, Timings] | None,
+]
+
+
+class HtmdFreezer(Freezer):
+    """
+    Freezer that skips post pages which have not changed.
+
+    Set `manifest` before calling freeze() to enable skipping.
+    Set `profile` to time each URL.
+    """
+
+    manifest: BuildManifest | None = None
+    profile: BuildProfile | None = None
+
+    def _build_one(
+        self,
+        url: str,
+        last_modified: dt.datetime | None = None,
+    ) -> Path:
+        if self.profile is None:
+            return self._build_or_skip(url, last_modified)
+        with self.profile.time_url(url):
+            return self._build_or_skip(url, last_modified)
+
+    def _build_or_skip(
+        self,
+        url: str,
+        last_modified: dt.datetime | None = None,
+    ) -> Path:
+        if self.manifest is None:
+            return super()._build_one(url, last_modified)
+
+        path = self.root / normalize('NFC', self.urlpath_to_filepath(url))
+        logged_calls = self.url_for_logger.logged_calls
+        links = self.manifest.unchanged_links(url, path)
+        if links is not None:
+            # Pages linked from this post still need to be frozen
+            logged_calls.extend(links)
+            return path
+
+        start = len(logged_calls)
+        new_path = super()._build_one(url, last_modified)
+        self.manifest.record(url, itertools.islice(logged_calls, start, None))
+        return new_path
+
+    def _estimated_cost(self, url: str) -> int:
+        """Use the size of the page from the last build to estimate cost."""
+        path = self.root / normalize('NFC', self.urlpath_to_filepath(url))
+        try:
+            return path.stat().st_size
+        except FileNotFoundError:
+            return 0
+
+    def freeze_parallel(self, jobs: int) -> set[str]:
+        """
+        Like freeze() but pages are rendered in `jobs` processes.
+
+        Worker processes are forked so the loaded posts are shared.
+        Pages found by rendering a page are rendered next,
+        largest pages from the last build first.
+        """
+        assert self.app is not None
+        assert self.manifest is not None
+        self.root.mkdir(parents=True, exist_ok=True)
+        seen_urls: set[str] = set()
+        seen_endpoints: set[str | None] = set()
+        built_paths: set[Path] = set()
+        pending: dict[Future[FrozenURL], str] = {}
+
+        context = multiprocessing.get_context('fork')
+        with ProcessPoolExecutor(
+            jobs,
+            mp_context=context,
+            initializer=_init_worker,
+        ) as executor:
+
+            def submit(found: Iterable[tuple[str, str | None]]) -> None:
+                new_urls = []
+                for url, endpoint in found:
+                    seen_endpoints.add(endpoint)
+                    if url not in seen_urls:
+                        seen_urls.add(url)
+                        new_urls.append(url)
+                new_urls.sort(key=self._estimated_cost, reverse=True)
+                for url in new_urls:
+                    pending[executor.submit(_freeze_url, url)] = url
+
+            submit((url, endpoint) for url, endpoint, _ in self._generate_all_urls())
+            try:
+                while pending:
+                    done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                    for future in done:
+                        url = pending.pop(future)
+                        path, found, entry, timings = future.result()
+                        built_paths.add(self.root / path)
+                        if entry:
+                            self.manifest.urls[url] = entry
+                        if timings:
+                            assert self.profile is not None
+                            self.profile.merge(*timings)
+                        submit(found)
+            except BaseException:
+                # Don't render the remaining pages
+                executor.shutdown(cancel_futures=True)
+                raise
+
+        self._check_endpoints(seen_endpoints)
+        # create_app() always sets FREEZER_REMOVE_EXTRA_FILES
+        self._remove_extra_files(built_paths)
+        return seen_urls
+
+    def _remove_extra_files(self, built_paths: set[Path]) -> None:
+        """Remove files from the previous build that are not here anymore."""
+        assert self.app is not None
+        ignore = self.app.config['FREEZER_DESTINATION_IGNORE']
+        previous_paths = {
+            self.root / name
+            for name in walk_directory(self.root, ignore=ignore)
+        }
+        for extra_path in previous_paths - built_paths:
+            extra_path.unlink()
+            with contextlib.suppress(OSError):
+                extra_path.parent.rmdir()
+
+
+freezer = HtmdFreezer(
     with_static_files=True,
     with_no_argument_rules=False,
 )
 
 
+def _init_worker() -> None:  # pragma: no cover
+    # Runs in worker processes.
+    # Only URLs from url_for calls are needed from _generate_all_urls()
+    # since the generators are run by the main process.
+    freezer.url_generators = []
+
+
+def _freeze_url(url: str) -> FrozenURL:  # pragma: no cover
+    # Runs in worker processes.
+    assert freezer.manifest is not None
+    path = freezer._build_one(url)  # noqa: SLF001
+    found = [
+        (found_url, endpoint)
+        for found_url, endpoint, _ in freezer._generate_all_urls()  # noqa: SLF001
+    ]
+    entry = freezer.manifest.urls.get(url)
+    timings = freezer.profile.pop_timings() if freezer.profile else None
+    return path.relative_to(freezer.root).as_posix(), found, entry, timings
+
+
 freeze_bp = Blueprint('freezer', __name__)
 
 
@@ -37,48 +199,48 @@ def home_page() -> Iterator[tuple[str, dict[str, str]]]:
 
 # Telling Frozen-Flask about routes that are not linked to in templates
 @freezer.register_generator
-def year_view() -> Iterator[tuple[str, dict[str, int]]]:
+def year_view() -> Iterator[tuple[str, dict[str, str]]]:
     posts = get_posts()
-    for post in posts.published_posts:
-        yield 'posts.year_view', {
-            'year': post.meta['published'].year,
-        }
+    for year in posts.archive:
+        yield 'posts.year_view', {'year': year}
 
 
 @freezer.register_generator
-def month_view() -> Iterator[tuple[str, dict[str, int | str]]]:
+def month_view() -> Iterator[tuple[str, dict[str, str]]]:
     posts = get_posts()
-    for post in posts.published_posts:
-        yield 'posts.month_view', {
-            'month': post.meta['published'].strftime('%m'),
-            'year': post.meta['published'].year,
-        }
+    for year, months in posts.archive.items():
+        for month in months:
+            yield 'posts.month_view', {'month': month, 'year': year}
 
 
 @freezer.register_generator
-def day_view() -> Iterator[tuple[str, dict[str, int | str]]]:
+def day_view() -> Iterator[tuple[str, dict[str, str]]]:
     posts = get_posts()
-    for post in posts.published_posts:
-        yield 'posts.day_view', {
-            'day': post.meta['published'].strftime('%d'),
-            'month': post.meta['published'].strftime('%m'),
-            'year': post.meta['published'].year,
-        }
+    for year, months in posts.archive.items():
+        for month, days in months.items():
+            for day in days:
+                yield 'posts.day_view', {
+                    'day': day,
+                    'month': month,
+                    'year': year,
+                }
+
+
+@freezer.register_generator
+def post() -> Iterator[str]:
+    # Templates link to posts with post.url instead of url_for
+    posts = get_posts()
+    for published_post in posts.published_posts:
+        assert published_post.url_path is not None
+        yield published_post.url_path
 
 
 @freezer.register_generator
 def draft() -> Iterator[tuple[str, dict[str, str]]]:
     posts = get_posts()
-    draft_posts = [
-        p
-        for p in posts
-        if 'draft' in p.meta
-        and 'build|' in str(p.meta['draft'])
-    ]
-    for post in draft_posts:
-        yield 'posts.draft', {
-            'post_uuid': post.meta['draft'].replace('build|', ''),
-        }
+    for post_uuid, post in posts.drafts.items():
+        if 'build|' in str(post.meta['draft']):
+            yield 'posts.draft', {'post_uuid': post_uuid}
 
 
 @freezer.register_generator
@@ -110,3 +272,9 @@ def posts_json() -> Iterable[tuple[str, dict[str, str]]]:
 @freezer.register_generator
 def redirects() -> Iterable[str]:
     yield from current_app.config['redirects']
+
+
+@freezer.register_generator
+def asset_manifest() -> Iterable[str]:
+    if ASSETS_EXTENSION in current_app.extensions:
+        yield ASSET_MANIFEST_URL
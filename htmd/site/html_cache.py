@@ -0,0 +1,70 @@
+import functools
+import hashlib
+from importlib.metadata import version
+import json
+from pathlib import Path
+
+from flask import Flask
+from flask_flatpages import FlatPages, pygmented_markdown
+
+from ..utils import atomic_write, prune_cache
+from .posts import get_posts, Posts
+
+
+HTML_CACHE_FOLDER = 'html'
+
+
+@functools.cache
+def get_renderer_versions() -> str:
+    return f"markdown={version('markdown')} pygments={version('pygments')}"
+
+
+def get_html_key(text: str, flatpages: FlatPages) -> str:
+    """Hash everything that changes the HTML of a post body."""
+    options = {
+        'extensions': flatpages.config('markdown_extensions'),
+        'extension_configs': flatpages.config('extension_configs'),
+        'versions': get_renderer_versions(),
+    }
+    hash_obj = hashlib.sha256()
+    hash_obj.update(json.dumps(options, sort_keys=True, default=repr).encode('utf-8'))
+    hash_obj.update(b'\x00')
+    hash_obj.update(text.encode('utf-8'))
+    return hash_obj.hexdigest()
+
+
+def get_html_path(cache_folder: Path, key: str) -> Path:
+    return cache_folder / HTML_CACHE_FOLDER / key[:2] / f'{key}.html'
+
+
+def cached_markdown(text: str, flatpages: Posts) -> str:
+    """
+    Render markdown to HTML using the HTML from a previous run when possible.
+
+    Used as FLATPAGES_HTML_RENDERER.
+    """
+    # post.html can be read without an app context
+    app = flatpages._app  # noqa: SLF001
+    assert app is not None
+    key = get_html_key(text, flatpages)
+    html_path = get_html_path(Path(app.config['CACHE_FOLDER']), key)
+    try:
+        return html_path.read_text()
+    except FileNotFoundError:
+        pass
+    html = pygmented_markdown(text, flatpages)
+    html_path.parent.mkdir(parents=True, exist_ok=True)
+    atomic_write(html_path, html)
+    return html
+
+
+def prune_html_cache(app: Flask) -> None:
+    """Remove the HTML of post bodies that are not in any post anymore."""
+    cache_folder = Path(app.config['CACHE_FOLDER'])
+    posts = get_posts(app)
+    with app.app_context():
+        used = [
+            get_html_path(cache_folder, get_html_key(post.body, posts))
+            for post in posts
+        ]
+    prune_cache(cache_folder / HTML_CACHE_FOLDER, used)
@@ -0,0 +1,155 @@
+from concurrent.futures import ProcessPoolExecutor
+import hashlib
+from importlib.metadata import version
+import json
+import multiprocessing
+from pathlib import Path
+
+from flask import Flask
+from flask_frozen import walk_directory
+from htmlmin import minify
+
+from ..utils import atomic_write, prune_cache
+
+
+MINIFY_HTML_FILE = 'minify-html.json'
+MINIFIED_HTML_FOLDER = 'minified-html'
+
+# path relative to the build folder -> hash of the minified HTML
+MinifiedDigests = dict[str, str]
+# path relative to the build folder -> cache key of the HTML
+CacheKeys = dict[str, str]
+
+
+def get_digest(content: bytes) -> str:
+    return hashlib.sha256(content).hexdigest()
+
+
+def get_cache_key(content: bytes) -> str:
+    """Hash the HTML and everything else that changes the minified HTML."""
+    hash_obj = hashlib.sha256()
+    hash_obj.update(version('htmlmin2').encode('utf-8'))
+    hash_obj.update(b'\x00')
+    hash_obj.update(content)
+    return hash_obj.hexdigest()
+
+
+def minify_file(path: Path, cache_path: Path) -> str:
+    """
+    Minify the HTML file at `path` and keep a copy in `cache_path`.
+
+    Return the hash of the minified HTML.
+    """
+    minified = minify(path.read_text())
+    atomic_write(path, minified)
+    cache_path.parent.mkdir(parents=True, exist_ok=True)
+    atomic_write(cache_path, minified)
+    return get_digest(minified.encode('utf-8'))
+
+
+def _minify_file(paths: tuple[Path, Path]) -> str:  # pragma: no cover
+    # Runs in worker processes.
+    return minify_file(*paths)
+
+
+class HtmlMinifier:
+    """
+    Minify the frozen HTML files after freezing.
+
+    Files that are the same as the minified file from the last build
+    (post pages which were not rendered again) are skipped.
+    Minified HTML is kept in CACHE_FOLDER by the hash of the HTML
+    so pages that are rendered again with the same HTML
+    are not minified again.
+    Only the minified HTML of the pages of the last build is kept.
+    """
+
+    def __init__(self, app: Flask) -> None:
+        self.site = Path(app.config['FREEZER_DESTINATION'])
+        cache_folder = Path(app.config['CACHE_FOLDER'])
+        self.path = cache_folder / MINIFY_HTML_FILE
+        self.cache_folder = cache_folder / MINIFIED_HTML_FOLDER
+        # Static files are copied as they are
+        self.ignore = [*app.config['FREEZER_DESTINATION_IGNORE'], 'static/']
+        self.previous, self.previous_keys = self._load()
+        self.pages: MinifiedDigests = {}
+        self.keys: CacheKeys = {}
+
+    def _load(self) -> tuple[MinifiedDigests, CacheKeys]:
+        try:
+            data = json.loads(self.path.read_text())
+        except (FileNotFoundError, json.JSONDecodeError):
+            return {}, {}
+        if data.get('htmlmin') != version('htmlmin2'):
+            return {}, {}
+        pages: MinifiedDigests = data.get('pages', {})
+        keys: CacheKeys = data.get('keys', {})
+        return pages, keys
+
+    def _cache_path(self, key: str) -> Path:
+        return self.cache_folder / key[:2] / f'{key}.html'
+
+    def changed_files(self) -> list[tuple[str, Path]]:
+        """
+        Return the HTML files that need to be minified with their cache path.
+
+        Files that are already minified are recorded,
+        files minified in a previous build are replaced from the cache.
+        """
+        changed = []
+        for name in sorted(walk_directory(self.site, ignore=self.ignore)):
+            if not name.endswith('.html'):
+                continue
+            path = self.site / name
+            content = path.read_bytes()
+            digest = get_digest(content)
+            if self.previous.get(name) == digest:
+                self.pages[name] = digest
+                if name in self.previous_keys:
+                    self.keys[name] = self.previous_keys[name]
+                continue
+            key = get_cache_key(content)
+            self.keys[name] = key
+            cache_path = self._cache_path(key)
+            try:
+                minified = cache_path.read_bytes()
+            except FileNotFoundError:
+                changed.append((name, cache_path))
+                continue
+            atomic_write(path, minified.decode('utf-8'))
+            self.pages[name] = get_digest(minified)
+        return changed
+
+    def minify(self, jobs: int) -> None:
+        """Minify the changed HTML files in `jobs` processes."""
+        changed = self.changed_files()
+        paths = [(self.site / name, cache_path) for name, cache_path in changed]
+        if jobs == 1 or len(paths) <= 1:
+            digests = [minify_file(*file_paths) for file_paths in paths]
+        else:
+            context = multiprocessing.get_context('fork')
+            with ProcessPoolExecutor(jobs, mp_context=context) as executor:
+                chunk_size = max(1, len(paths) // (jobs * 4))
+                digests = list(executor.map(_minify_file, paths, chunksize=chunk_size))
+        for (name, _), digest in zip(changed, digests, strict=True):
+            self.pages[name] = digest
+
+    def save(self) -> None:
+        data = {
+            'htmlmin': version('htmlmin2'),
+            'pages': self.pages,
+            'keys': self.keys,
+        }
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        atomic_write(self.path, json.dumps(data))
+        prune_cache(
+            self.cache_folder,
+            (self._cache_path(key) for key in self.keys.values()),
+        )
+
+
+def minify_html_files(app: Flask, jobs: int) -> None:
+    """Minify the HTML files in the build folder in `jobs` processes."""
+    minifier = HtmlMinifier(app)
+    minifier.minify(jobs)
+    minifier.save()
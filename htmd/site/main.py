@@ -1,8 +1,8 @@
 from collections.abc import Callable, Generator
+import functools
 from pathlib import Path
 import threading
 
-from bs4 import BeautifulSoup
 from flask import (
     Blueprint,
     current_app,
@@ -12,10 +12,18 @@ from flask import (
     send_from_directory,
 )
 from flask.typing import ResponseReturnValue
-from flask_flatpages import pygments_style_defs
-from htmlmin import minify
 
+from .assets import AssetManifest
+from .bundle import (
+    BUNDLE_CSS,
+    BUNDLE_JS,
+    get_css_bundle,
+    get_js_bundle,
+    HTMD_STATIC_FOLDER,
+)
 from .posts import get_posts
+from .pretty_html import prettify
+from .pygments_css import get_pygments_css
 
 
 main_bp = Blueprint('main', __name__)
@@ -23,14 +31,9 @@ main_bp = Blueprint('main', __name__)
 
 @main_bp.after_request
 def format_html(response: Response) -> Response:
-    if response.mimetype == 'text/html':
-        if current_app.config.get('PRETTY_HTML', False):
-            response.data = BeautifulSoup(
-                response.data,
-                'html.parser',
-            ).prettify()
-        elif current_app.config.get('MINIFY_HTML', False):
-            response.data = minify(response.data.decode('utf-8'))
+    # MINIFY_HTML is applied by htmd build after freezing
+    if response.mimetype == 'text/html' and current_app.config['PRETTY_HTML']:
+        response.data = prettify(response.get_data(as_text=True))
     return response
 
 
@@ -51,10 +54,35 @@ def changes() -> Response:
     return Response(event_stream(event), mimetype='text/event-stream')
 
 
+def get_site_pygments_css() -> str:
+    # Created once for the style and the tokens in the posts
+    return get_pygments_css(
+        current_app.config['PYGMENTS_STYLE'],
+        get_posts().code_classes,
+        minify=current_app.config['MINIFY_CSS'],
+    )
+
+
+def get_site_css_bundle() -> str:
+    return get_css_bundle(get_site_pygments_css())
+
+
+def add_generated_assets(assets: AssetManifest, *, bundle: bool) -> None:
+    """Fingerprint the static files that are not in the static folder."""
+    for name in ('htmd.css', 'htmd.js', 'password-protect.js'):
+        path = HTMD_STATIC_FOLDER / name
+        # The files of htmd do not change while it runs
+        assets.add_generated(name, functools.cache(path.read_bytes))
+    assets.add_generated('pygments.css', get_site_pygments_css)
+    if bundle:
+        assets.add_generated(BUNDLE_CSS, get_site_css_bundle)
+        assets.add_generated(BUNDLE_JS, get_js_bundle)
+
+
 # Will end up in the static directory
 @main_bp.route('/static/pygments.css')
 def pygments_css() -> ResponseReturnValue:
-    response = make_response(pygments_style_defs('tango'))
+    response = make_response(get_site_pygments_css())
     response.headers['Content-Type'] = 'text/css'
     # Tells browser to cache for 1 year
     response.cache_control.max_age = 31536000
@@ -62,6 +90,21 @@ def pygments_css() -> ResponseReturnValue:
     return response
 
 
+# [static] bundle = true
+@main_bp.route(f'/static/{BUNDLE_CSS}')
+def css_bundle() -> ResponseReturnValue:
+    response = make_response(get_site_css_bundle())
+    response.mimetype = 'text/css'
+    return response
+
+
+@main_bp.route(f'/static/{BUNDLE_JS}')
+def js_bundle() -> ResponseReturnValue:
+    response = make_response(get_js_bundle())
+    response.mimetype = 'text/javascript'
+    return response
+
+
 @main_bp.route('/static/password-protect.js')
 def static_password_protect() -> ResponseReturnValue:
     this_dir = Path(__file__).parent
@@ -92,12 +135,8 @@ def static_htmd_js() -> ResponseReturnValue:
 @main_bp.route('/')
 def index() -> ResponseReturnValue:
     posts = get_posts()
-    latest = sorted(
-        posts.published_posts,
-        reverse=True,
-        key=lambda p: p.meta['published'],
-    )
-    return render_template('index.html', active='home', posts=latest[:4])
+    latest = posts.latest_posts[:4]
+    return render_template('index.html', active='home', posts=latest)
 
 
 # Used during preview
@@ -0,0 +1,174 @@
+from collections.abc import Iterable
+import hashlib
+from importlib.metadata import version
+import json
+from pathlib import Path
+import typing
+
+from flask import Flask
+from flask_flatpages import Page
+from werkzeug.exceptions import HTTPException
+
+from ..constants import CONFIG_FILE
+from ..utils import atomic_write
+from .assets import ASSETS_EXTENSION
+from .posts import get_posts, Post
+
+
+MANIFEST_FILE = 'build-manifest.json'
+
+Link = tuple[str, dict[str, typing.Any]]
+
+
+def get_config_digest(app: Flask) -> str:
+    """Hash everything outside of a post that changes a post page."""
+    hash_obj = hashlib.sha256()
+    hash_obj.update(version('htmd').encode('utf-8'))
+    config_path = Path(app.config['PROJECT_DIR']) / CONFIG_FILE
+    hash_obj.update(config_path.read_bytes())
+    globals_used = {
+        key: app.jinja_env.globals.get(key)
+        for key in ('FILES_CSS', 'FILES_JS', 'MINIFY_CSS', 'MINIFY_JS')
+    }
+    hash_obj.update(json.dumps(globals_used, sort_keys=True).encode('utf-8'))
+    assets = app.extensions.get(ASSETS_EXTENSION)
+    if assets is not None:
+        # Pages link to the fingerprinted names of static files
+        with app.app_context():
+            names = assets.as_dict()
+        hash_obj.update(json.dumps(names).encode('utf-8'))
+    hash_obj.update(str(app.config['SHOW_DRAFTS']).encode('utf-8'))
+    return hash_obj.hexdigest()
+
+
+def get_templates_digest(folders: Iterable[Path]) -> str:
+    hash_obj = hashlib.sha256()
+    for folder in folders:
+        if not folder.is_dir():
+            continue
+        for template_path in sorted(folder.rglob('*.html')):
+            name = template_path.relative_to(folder).as_posix()
+            hash_obj.update(name.encode('utf-8'))
+            hash_obj.update(b'\x00')
+            hash_obj.update(template_path.read_bytes())
+            hash_obj.update(b'\x00')
+    return hash_obj.hexdigest()
+
+
+def get_post_digest(post: Page) -> str:
+    """
+    Hash the metadata and source of a post.
+
+    `_hash` is part of the metadata,
+    the rest of the metadata is included because fields like
+    subtitle and description are rendered but are not part of `_hash`.
+    """
+    meta = json.dumps(post.meta, sort_keys=True, default=str)
+    hash_obj = hashlib.sha256()
+    hash_obj.update(meta.encode('utf-8'))
+    hash_obj.update(b'\x00')
+    hash_obj.update(post.body.encode('utf-8'))
+    return hash_obj.hexdigest()
+
+
+def get_cached_post_digest(post: Page) -> str:
+    """
+    Return get_post_digest(post), hashed once for each post.
+
+    The digests are cleared by Posts.reindex().
+    """
+    if not isinstance(post, Post):
+        return get_post_digest(post)
+    if post.digest is None:
+        post.digest = get_post_digest(post)
+    return post.digest
+
+
+class BuildManifest:
+    """
+    Record the inputs used to render each post page.
+
+    A post page is only rendered again when the post,
+    the templates, or the config have changed since the last build.
+    The url_for calls made while rendering are stored
+    so the pages linked from a skipped post are still frozen.
+    """
+
+    def __init__(self, app: Flask, *, full: bool = False) -> None:
+        self.app = app
+        self.path = Path(app.config['CACHE_FOLDER']) / MANIFEST_FILE
+        self.config_digest = get_config_digest(app)
+        assert app.template_folder is not None
+        self.templates_digest = get_templates_digest((
+            Path(app.config['PROJECT_DIR']) / app.config['TEMPLATE_FOLDER'],
+            Path(app.root_path) / app.template_folder,
+        ))
+        self.previous: dict[str, dict[str, typing.Any]] = {}
+        if not full:
+            self.previous = self._load()
+        self.urls: dict[str, dict[str, typing.Any]] = {}
+        self._post_digests: dict[str, str | None] = {}
+
+    def _load(self) -> dict[str, dict[str, typing.Any]]:
+        try:
+            data = json.loads(self.path.read_text())
+        except (FileNotFoundError, json.JSONDecodeError):
+            return {}
+        if data.get('config') != self.config_digest:
+            return {}
+        if data.get('templates') != self.templates_digest:
+            return {}
+        urls: dict[str, dict[str, typing.Any]] = data.get('urls', {})
+        return urls
+
+    def _get_post(self, url: str) -> Page | None:
+        adapter = self.app.url_map.bind('localhost')
+        try:
+            endpoint, values = adapter.match(url)
+        except HTTPException:  # pragma: no cover
+            return None
+        if endpoint != 'posts.post':
+            return None
+        posts = get_posts(self.app)
+        path = values['path']
+        return posts.get(path) or posts.get(f'password-protect/{path}')
+
+    def post_digest(self, url: str) -> str | None:
+        if url not in self._post_digests:
+            post = self._get_post(url)
+            digest = get_cached_post_digest(post) if post else None
+            self._post_digests[url] = digest
+        return self._post_digests[url]
+
+    def unchanged_links(self, url: str, path: Path) -> list[Link] | None:
+        """
+        Return the links of an unchanged post page.
+
+        None is returned when the page needs to be rendered.
+        """
+        digest = self.post_digest(url)
+        if digest is None:
+            return None
+        entry = self.previous.get(url)
+        if not entry or entry['post'] != digest or not path.is_file():
+            return None
+        self.urls[url] = entry
+        return [(endpoint, values) for endpoint, values in entry['links']]
+
+    def record(self, url: str, links: Iterable[Link]) -> None:
+        digest = self.post_digest(url)
+        if digest is None:
+            return
+        self.urls[url] = {
+            'post': digest,
+            'links': [[endpoint, values] for endpoint, values in links],
+        }
+
+    def save(self) -> None:
+        data = {
+            'config': self.config_digest,
+            'templates': self.templates_digest,
+            'urls': self.urls,
+        }
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        atomic_write(self.path, json.dumps(data, default=str))
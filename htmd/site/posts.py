@@ -1,18 +1,21 @@
 import calendar
 from collections.abc import Iterator
 import datetime
+import functools
 from pathlib import Path
+import re
+import typing
 
-from bs4 import BeautifulSoup
-from bs4.element import NavigableString, PageElement
 from feedwerk.atom import AtomFeed
 from flask import (
     abort,
     Blueprint,
     current_app,
     Flask,
+    has_request_context,
     jsonify,
     render_template,
+    request,
     Response,
     url_for,
 )
@@ -21,7 +24,8 @@ from flask.typing import ResponseReturnValue
 from flask_flatpages import FlatPages, Page
 from werkzeug.routing import BaseConverter, Map
 
-from ..password_protect import encrypt_post
+from .pygments_css import get_code_classes
+from .truncate_html import truncate_html
 
 
 class RegexConverter(BaseConverter):
@@ -30,16 +34,83 @@ class RegexConverter(BaseConverter):
         self.regex = items[0]
 
 
+# year -> month -> day -> posts, oldest first
+Archive = dict[str, dict[str, dict[str, list[Page]]]]
+
+
+def published_sort_key(post: Page) -> datetime.datetime:
+    published = post.meta['published']
+    if isinstance(published, datetime.datetime):
+        return published
+    # published is a date until sync_posts() has run
+    return datetime.datetime.combine(
+        published,
+        datetime.time.min,
+        tzinfo=datetime.UTC,
+    )
+
+
+class Post(Page):
+    """
+    Page of a post with its permalink.
+
+    url_path and external_url are set by Posts.reindex(),
+    they are None when the post does not have a published date.
+    """
+
+    # URL relative to the root of the site
+    url_path: str | None = None
+    external_url: str | None = None
+    # Set by get_cached_post_digest(), cleared by Posts.reindex()
+    digest: str | None = None
+
+    @property
+    def url(self) -> str | None:
+        """URL of the post for the current request, like url_for()."""
+        if self.url_path is None or not has_request_context():
+            return self.url_path
+        return request.script_root + self.url_path
+
+
 class Posts(FlatPages):
     def __init__(self, app: Flask | None = None) -> None:
         super().__init__(app)
         self.show_drafts: bool = False
-        self.published_posts: list[Page] = []
+        self.published_posts: list[Post] = []
+        # published_posts newest first
+        self.latest_posts: list[Post] = []
+        self.archive: Archive = {}
+        # tag -> posts and author -> posts, including drafts
+        self.tags: dict[str, list[Page]] = {}
+        self.authors: dict[str, list[Page]] = {}
+        # draft UUID -> post
+        self.drafts: dict[str, Page] = {}
+        # tag -> number of published posts
+        self.tag_counts: dict[str, int] = {}
+        # Found when pygments.css is created
+        self._code_classes: frozenset[str] | None = None
         self._app = app
 
-    def __iter__(self) -> Iterator[Page]:
-        """Iterate on a snapshot of all :class:`Page` objects."""
-        return iter(list(self._pages.values()))
+    @typing.override
+    def config(self, key: str) -> typing.Any:
+        """Read the configuration of the app, with or without an app context."""
+        app = self._app or current_app
+        return app.config[f'{self.config_prefix}_{key.upper()}']
+
+    def __iter__(self) -> Iterator[Post]:
+        """Iterate on a snapshot of all :class:`Post` objects."""
+        # Every page is created by _parse()
+        return iter(typing.cast('list[Post]', list(self._pages.values())))
+
+    def _parse(self, content: str, path: str, rel_path: str) -> Post:
+        page = super()._parse(content, path, rel_path)
+        return Post(
+            page.path,
+            page._meta,  # noqa: SLF001
+            page.body,
+            page.html_renderer,
+            page.folder,
+        )
 
     def reload(self, *, show_drafts: bool | None = None) -> None:
         super().reload()
@@ -48,14 +119,108 @@ class Posts(FlatPages):
 
         if not self._app:
             return
+        self.reindex()
+
+    def reindex(self) -> None:
+        """
+        Update the indexes of posts.
+
+        published_posts, latest_posts, archive, tags, authors,
+        drafts, and tag_counts, and the URLs of each post.
+
+        Needs to be called after post metadata is changed.
+        """
+        assert self._app is not None
         with self._app.app_context():
-            new_published_posts = [
-                p for p in self
-                if 'published' in p.meta
-                and hasattr(p.meta['published'], 'year')
-                and (self.show_drafts or not p.meta.get('draft', False))
-            ]
+            all_posts = list(self)
+        for post in all_posts:
+            post.digest = None
+        self.set_urls(all_posts)
+        new_published_posts = [
+            p for p in all_posts
+            if 'published' in p.meta
+            and hasattr(p.meta['published'], 'year')
+            and (self.show_drafts or not p.meta.get('draft', False))
+        ]
         self.published_posts = new_published_posts
+        self.latest_posts = sorted(
+            new_published_posts,
+            reverse=True,
+            key=published_sort_key,
+        )
+
+        archive: Archive = {}
+        for post in sorted(new_published_posts, key=published_sort_key):
+            date_str = post.meta['published'].strftime('%Y-%m-%d')
+            year, month, day = date_str.split('-')
+            days = archive.setdefault(year, {}).setdefault(month, {})
+            days.setdefault(day, []).append(post)
+        self.archive = archive
+
+        tags: dict[str, list[Page]] = {}
+        authors: dict[str, list[Page]] = {}
+        drafts: dict[str, Page] = {}
+        for post in all_posts:
+            for tag in post.meta.get('tags', []):
+                tags.setdefault(tag, []).append(post)
+            if 'author' in post.meta:
+                authors.setdefault(post.meta['author'], []).append(post)
+            if 'draft' in post.meta:
+                post_uuid = str(post.meta['draft']).replace('build|', '')
+                drafts.setdefault(post_uuid, post)
+        self.tags = tags
+        self.authors = authors
+        self.drafts = drafts
+
+        tag_counts: dict[str, int] = {}
+        for post in new_published_posts:
+            for tag in post.meta.get('tags', []):
+                tag_counts[tag] = tag_counts.get(tag, 0) + 1
+        self.tag_counts = tag_counts
+        self._code_classes = None
+
+    @property
+    def code_classes(self) -> frozenset[str]:
+        """Classes of the tokens highlighted by Pygments in every post."""
+        if self._code_classes is None:
+            self._code_classes = get_code_classes(self)
+        return self._code_classes
+
+    def set_urls(self, all_posts: list[Post]) -> None:
+        """
+        Set post.url_path and post.external_url, the permalink of each post.
+
+        URLs are built once here instead of with url_for() in every page.
+        The site URL is used the same way the freezer uses it,
+        the path of the site URL is only kept in external_url.
+        """
+        assert self._app is not None
+        base_url = self._app.config.get('FREEZER_BASE_URL') or None
+        with self._app.test_request_context(base_url=base_url):
+            host_url = request.host_url.rstrip('/')
+            for post in all_posts:
+                published = post.meta.get('published')
+                if not hasattr(published, 'year'):
+                    post.url_path = None
+                    post.external_url = None
+                    continue
+                assert published is not None
+                url = url_for(
+                    'posts.post',
+                    year=published.strftime('%Y'),
+                    month=published.strftime('%m'),
+                    day=published.strftime('%d'),
+                    path=get_url_path(post),
+                )
+                post.url_path = url.removeprefix(request.script_root)
+                post.external_url = host_url + url
+
+
+def get_url_path(post: Page) -> str:
+    """Return the path of a post in its URL, without password-protect/."""
+    if post.meta.get('password', False) is not False:
+        return post.path.removeprefix('password-protect/')
+    return post.path
 
 
 def get_posts(app: Flask | None = None) -> Posts:
@@ -65,38 +230,27 @@ def get_posts(app: Flask | None = None) -> Posts:
     return ret
 
 
+# Everything before <!--more--> in a post is its preview
+MORE_RE = re.compile(r'<!--\s*more\s*-->')
+
+
 def truncate_post_html(post_html: str, limit: int = 255) -> str:
-    soup = BeautifulSoup(post_html, 'html.parser')
-    all_text_nodes = list(soup.find_all(string=True))
-    full_text_len = len(soup.get_text())
-
-    current_count = 0
-    suffix = '...'
-    for node in all_text_nodes:
-        node_len = len(node)
-
-        if current_count + node_len > limit:
-            if full_text_len - limit <= len(suffix):
-                return soup.decode()
-
-            # truncate current node
-            chars_to_keep = limit - current_count
-            new_content = node[:chars_to_keep].rstrip() + suffix
-            new_node = NavigableString(new_content)
-            node.replace_with(new_node)
-
-            # prune the tree
-            curr: PageElement | None = new_node
-            while curr and curr != soup:
-                for sibling in list(curr.next_siblings):
-                    sibling.extract()
-                curr = curr.parent
-            break
-
-        current_count += node_len
-
-    ret = soup.decode()
-    return ret
+    """
+    Return the HTML of a post with the text after `limit` characters removed.
+
+    Only the HTML before <!--more--> is returned when the post has one.
+    """
+    more = MORE_RE.search(post_html)
+    if more:
+        return post_html[:more.start()].rstrip()
+    return _truncate_post_html(post_html, limit)
+
+
+# post.html returns the same string on every call
+# so its hash is only computed once for each post
+@functools.lru_cache(maxsize=1024)
+def _truncate_post_html(post_html: str, limit: int) -> str:
+    return truncate_html(post_html, limit)
 
 
 def on_load(state: BlueprintSetupState) -> None:
@@ -127,15 +281,6 @@ def feed() -> Response:
 
     posts = get_posts()
     for post in posts.published_posts:
-        url = url_for(
-            'posts.post',
-            year=post.meta['published'].strftime('%Y'),
-            month=post.meta['published'].strftime('%m'),
-            day=post.meta['published'].strftime('%d'),
-            path=post.path,
-            _external=True,
-        )
-
         # published and updated need to be datetime
         published = post.meta['published']
         post_datetime = post.meta.get('updated', published)
@@ -154,7 +299,7 @@ def feed() -> Response:
             content_type='html',
             published=published,
             updated=post_datetime,
-            url=url,
+            url=post.external_url,
         )
     ret = atom.get_response()
     return ret
@@ -162,27 +307,17 @@ def feed() -> Response:
 
 def posts_json() -> ResponseReturnValue:
     posts = get_posts(current_app)
-    urls = [
-        url_for(
-            'posts.post',
-            year=post.meta['published'].strftime('%Y'),
-            month=post.meta['published'].strftime('%m'),
-            day=post.meta['published'].strftime('%d'),
-            path=post.path,
-        )
-        for post in posts.published_posts
-    ]
+    urls = [post.url for post in posts.published_posts]
     return jsonify(urls)
 
 
 def all_posts() -> ResponseReturnValue:
     posts = get_posts()
-    latest = sorted(
-        posts.published_posts,
-        reverse=True,
-        key=lambda p: p.meta['published'],
+    return render_template(
+        'all_posts.html',
+        active='posts',
+        posts=posts.latest_posts,
     )
-    return render_template('all_posts.html', active='posts', posts=latest)
 
 
 def draft_and_not_shown(post: Page) -> bool:
@@ -201,12 +336,7 @@ def render_password_protected_post(post: Page) -> ResponseReturnValue:
         encrypted_content,
         encrypted_title,
         encrypted_subtitle,
-    ) = encrypt_post(
-        post.html,
-        post.meta['title'],
-        post.meta.get('subtitle'),
-        post.meta['password'],
-    )
+    ) = current_app.config['ENCRYPT_POST'](post, get_posts())
     return render_template(
         'post.html',
         active=post.path,
@@ -240,10 +370,8 @@ def post(year: str, month: str, day: str, path: str) -> ResponseReturnValue:
 
 def draft(post_uuid: str) -> ResponseReturnValue:
     posts = get_posts()
-    for post in posts:
-        if str(post.meta.get('draft', '')).replace('build|', '') == post_uuid:
-            break
-    else:
+    post = posts.drafts.get(post_uuid)
+    if not post:
         abort(404)
     if post.meta.get('password'):
         return render_password_protected_post(post)
@@ -255,14 +383,12 @@ def draft(post_uuid: str) -> ResponseReturnValue:
 
 
 def all_tags() -> ResponseReturnValue:
-    tag_counts: dict[str, int] = {}
     posts = get_posts()
-    for post in posts.published_posts:
-        for tag in post.meta.get('tags', []):
-            if tag not in tag_counts:
-                tag_counts[tag] = 0
-            tag_counts[tag] += 1
-    return render_template('all_tags.html', active='tags', tags=tag_counts)
+    return render_template(
+        'all_tags.html',
+        active='tags',
+        tags=posts.tag_counts,
+    )
 
 
 def no_posts_shown(post_list: list[Page]) -> bool:
@@ -276,11 +402,7 @@ def tag(tag: str) -> ResponseReturnValue:
     posts = get_posts()
     # Not using published_posts because build draft can link to a tag
     # and build will fail if link is 404
-    tagged = [
-        p
-        for p in posts
-        if tag in p.meta.get('tags', [])
-    ]
+    tagged = posts.tags.get(tag, [])
     if not tagged:
         abort(404)
     if not posts.show_drafts and no_posts_shown(tagged):
@@ -316,11 +438,7 @@ def author(author: str) -> ResponseReturnValue:
     # page is served without displaying posts
     # so no 404 when for the link from the draft
     posts = get_posts()
-    posts_author = [
-        p
-        for p in posts
-        if author == p.meta.get('author', '')
-    ]
+    posts_author = posts.authors.get(author, [])
 
     if not posts_author:
         abort(404)
@@ -356,60 +474,46 @@ def author(author: str) -> ResponseReturnValue:
 
 def year_view(year: str) -> ResponseReturnValue:
     posts = get_posts()
+    months = posts.archive.get(year)
+    if not months:
+        abort(404)
     year_posts = [
         p
-        for p in posts.published_posts
-        if year == p.meta['published'].strftime('%Y')
+        for days in months.values()
+        for day_posts in days.values()
+        for p in day_posts
     ]
-    if not year_posts:
-        abort(404)
-    sorted_posts = sorted(
-        year_posts,
-        reverse=False,
-        key=lambda p: p.meta['published'],
-    )
     return render_template(
         'year.html',
         active=year,
         year=year,
-        posts=sorted_posts,
+        posts=year_posts,
     )
 
 
 def month_view(year: str, month: str) -> ResponseReturnValue:
     posts = get_posts()
+    days = posts.archive.get(year, {}).get(month)
+    if not days:
+        abort(404)
     month_posts = [
         p
-        for p in posts.published_posts
-        if year == p.meta['published'].strftime('%Y')
-        and month == p.meta['published'].strftime('%m')
+        for day_posts in days.values()
+        for p in day_posts
     ]
-    if not month_posts:
-        abort(404)
-    sorted_posts = sorted(
-        month_posts,
-        reverse=False,
-        key=lambda p: p.meta['published'],
-    )
     month_string = calendar.month_name[int(month)]
     return render_template(
         'month.html',
         active=year,
         year=year,
         month_string=month_string,
-        posts=sorted_posts,
+        posts=month_posts,
     )
 
 
 def day_view(year: str, month: str, day: str) -> ResponseReturnValue:
     posts = get_posts()
-    day_posts = [
-        p
-        for p in posts.published_posts
-        if year == p.meta['published'].strftime('%Y')
-        and month == p.meta['published'].strftime('%m')
-        and day == p.meta['published'].strftime('%d')
-    ]
+    day_posts = posts.archive.get(year, {}).get(month, {}).get(day)
     if not day_posts:
         abort(404)
     month_string = calendar.month_name[int(month)]
@@ -0,0 +1,208 @@
+from html import unescape
+from html.entities import html5
+from html.parser import HTMLParser
+import re
+
+
+# These match the rules of BeautifulSoup(html, 'html.parser').prettify()
+# so [html] pretty = true output does not change
+INDENT = ' '
+VOID_TAGS = frozenset({
+    'area', 'base', 'basefont', 'bgsound', 'br', 'col', 'command', 'embed',
+    'frame', 'hr', 'image', 'img', 'input', 'isindex', 'keygen', 'link',
+    'menuitem', 'meta', 'nextid', 'param', 'source', 'spacer', 'track', 'wbr',
+})
+# Contents are written as they are
+PRESERVE_WHITESPACE_TAGS = frozenset({'pre', 'textarea'})
+# Text is not escaped
+CDATA_TAGS = frozenset({'script', 'style'})
+# Whitespace separated values are joined with a single space
+LIST_ATTRIBUTES: dict[str, frozenset[str]] = {
+    '*': frozenset({'accesskey', 'class', 'dropzone'}),
+    'a': frozenset({'rel', 'rev'}),
+    'area': frozenset({'rel'}),
+    'form': frozenset({'accept-charset'}),
+    'icon': frozenset({'sizes'}),
+    'iframe': frozenset({'sandbox'}),
+    'link': frozenset({'rel', 'rev'}),
+    'object': frozenset({'archive'}),
+    'output': frozenset({'for'}),
+    'td': frozenset({'headers'}),
+    'th': frozenset({'headers'}),
+}
+OUTPUT_CHARSET = 'utf-8'
+CHARSET_RE = re.compile(r'((^|;)\s*charset=)([^;]*)', re.MULTILINE)
+ESCAPE_RE = re.compile('[&<>]')
+ESCAPES = {'&': '&amp;', '<': '&lt;', '>': '&gt;'}
+
+
+def escape(text: str) -> str:
+    return ESCAPE_RE.sub(lambda match: ESCAPES[match.group()], text)
+
+
+def quote_attribute(value: str) -> str:
+    value = escape(value)
+    if '"' not in value:
+        return f'"{value}"'
+    if "'" not in value:
+        return f"'{value}'"
+    value = value.replace('"', '&quot;')
+    return f'"{value}"'
+
+
+def format_attributes(tag: str, attrs: list[tuple[str, str | None]]) -> str:
+    values: dict[str, str] = {}
+    for key, value in attrs:
+        # Later duplicates replace earlier ones
+        values[key] = '' if value is None else value
+
+    list_attributes = LIST_ATTRIBUTES['*'] | LIST_ATTRIBUTES.get(tag, frozenset())
+    for key in list_attributes & values.keys():
+        values[key] = ' '.join(values[key].split())
+
+    if tag == 'meta':
+        if 'charset' in values:
+            values['charset'] = OUTPUT_CHARSET
+        elif (
+            'content' in values
+            and values.get('http-equiv', '').lower() == 'content-type'
+        ):
+            values['content'] = CHARSET_RE.sub(
+                lambda match: match.group(1) + OUTPUT_CHARSET,
+                values['content'],
+            )
+
+    return ''.join(
+        f' {key}={quote_attribute(value)}'
+        for key, value in sorted(values.items())
+    )
+
+
+class PrettyPrinter(HTMLParser):
+    """
+    Indent HTML as it is parsed, without building a tree.
+
+    Only the names of open tags are kept,
+    to close them and to know how far to indent.
+    """
+
+    def __init__(self) -> None:
+        # Entities are handled like BeautifulSoup handles them
+        super().__init__(convert_charrefs=False)
+        self.pieces: list[str] = []
+        self.open_tags: list[str] = []
+        self.text: list[str] = []
+        # Depth of the <pre> or <textarea> whose contents are written as they are
+        self.literal_depth: int | None = None
+
+    def write(self, piece: str, *, after: bool = True) -> None:
+        if self.literal_depth is not None:
+            self.pieces.append(piece)
+            return
+        self.pieces.append(INDENT * len(self.open_tags))
+        self.pieces.append(piece)
+        if after:
+            self.pieces.append('\n')
+
+    def write_text(self) -> None:
+        if not self.text:
+            return
+        text = ''.join(self.text)
+        self.text.clear()
+        if not self.open_tags or self.open_tags[-1] not in CDATA_TAGS:
+            text = escape(text)
+        if self.literal_depth is None:
+            text = text.strip()
+            if not text:
+                return
+        self.write(text)
+
+    def write_markup(self, piece: str) -> None:
+        self.write_text()
+        if self.literal_depth is None:
+            piece = piece.strip()
+        self.write(piece)
+
+    def open_tag(self, tag: str, attrs: list[tuple[str, str | None]]) -> None:
+        self.write_text()
+        attributes = format_attributes(tag, attrs)
+        if tag in VOID_TAGS:
+            self.write(f'<{tag}{attributes}/>')
+            return
+        if self.literal_depth is None and tag in PRESERVE_WHITESPACE_TAGS:
+            self.write(f'<{tag}{attributes}>', after=False)
+            self.literal_depth = len(self.open_tags)
+        else:
+            self.write(f'<{tag}{attributes}>')
+        self.open_tags.append(tag)
+
+    def close_tag(self) -> None:
+        tag = self.open_tags.pop()
+        if self.literal_depth == len(self.open_tags):
+            self.pieces.append(f'</{tag}>\n')
+            self.literal_depth = None
+        else:
+            self.write(f'</{tag}>')
+
+    def handle_starttag(self, tag: str, attrs: list[tuple[str, str | None]]) -> None:
+        self.open_tag(tag, attrs)
+
+    def handle_startendtag(
+        self,
+        tag: str,
+        attrs: list[tuple[str, str | None]],
+    ) -> None:
+        self.open_tag(tag, attrs)
+        if tag not in VOID_TAGS:
+            self.close_tag()
+
+    def handle_endtag(self, tag: str) -> None:
+        self.write_text()
+        # An end tag without a start tag is ignored,
+        # otherwise every tag opened after it is closed too
+        if tag in VOID_TAGS or tag not in self.open_tags:
+            return
+        while self.open_tags[-1] != tag:
+            self.close_tag()
+        self.close_tag()
+
+    def handle_data(self, data: str) -> None:
+        self.text.append(data)
+
+    def handle_entityref(self, name: str) -> None:
+        self.text.append(html5.get(f'{name};', f'&{name}'))
+
+    def handle_charref(self, name: str) -> None:
+        self.text.append(unescape(f'&#{name};'))
+
+    def handle_comment(self, data: str) -> None:
+        self.write_markup(f'<!--{data}-->')
+
+    def handle_decl(self, decl: str) -> None:
+        self.write_markup(f'<!DOCTYPE {decl[len("DOCTYPE "):]}>')
+
+    def handle_pi(self, data: str) -> None:
+        self.write_markup(f'<?{data}>')
+
+    def unknown_decl(self, data: str) -> None:
+        if data.upper().startswith('CDATA['):
+            self.write_markup(f'<![CDATA[{data[len("CDATA["):]}]]>')
+        else:
+            self.write_markup(f'<?{data}?>')
+
+    def close(self) -> None:
+        super().close()
+        self.write_text()
+        while self.open_tags:
+            self.close_tag()
+
+    def getvalue(self) -> str:
+        return ''.join(self.pieces)
+
+
+def prettify(html: str) -> str:
+    """Return html with each tag and text on its own indented line."""
+    printer = PrettyPrinter()
+    printer.feed(html)
+    printer.close()
+    return printer.getvalue()
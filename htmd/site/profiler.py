@@ -0,0 +1,137 @@
+from collections.abc import Iterator
+import contextlib
+import json
+import os
+from pathlib import Path
+import time
+import typing
+
+from flask import before_render_template, Flask, template_rendered
+from jinja2 import Template
+
+
+# name -> durations in seconds
+Timings = dict[str, list[float]]
+
+
+def cpu_time() -> float:
+    """CPU time of this process and the child processes that have finished."""
+    times = os.times()
+    return (
+        times.user
+        + times.system
+        + times.children_user
+        + times.children_system
+    )
+
+
+class BuildProfile:
+    """
+    Record where the time of `htmd build --profile` is spent.
+
+    Stages are timed with stage(),
+    frozen URLs with time_url(),
+    and templates with the Flask template signals once connect() is called.
+    """
+
+    def __init__(self) -> None:
+        # stage -> {'wall': seconds, 'cpu': seconds}
+        self.stages: dict[str, dict[str, float]] = {}
+        self.urls: Timings = {}
+        self.templates: Timings = {}
+        self._template_starts: list[float] = []
+
+    @contextlib.contextmanager
+    def stage(self, name: str) -> Iterator[None]:
+        wall_start = time.perf_counter()
+        cpu_start = cpu_time()
+        try:
+            yield
+        finally:
+            self.stages[name] = {
+                'wall': time.perf_counter() - wall_start,
+                'cpu': cpu_time() - cpu_start,
+            }
+
+    @contextlib.contextmanager
+    def time_url(self, url: str) -> Iterator[None]:
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.urls.setdefault(url, []).append(time.perf_counter() - start)
+
+    def _before_render(
+        self,
+        _sender: Flask,
+        **_extra: typing.Any,  # noqa: ANN401
+    ) -> None:
+        self._template_starts.append(time.perf_counter())
+
+    def _rendered(
+        self,
+        _sender: Flask,
+        template: Template,
+        **_extra: typing.Any,  # noqa: ANN401
+    ) -> None:
+        elapsed = time.perf_counter() - self._template_starts.pop()
+        name = template.name or '<string>'
+        self.templates.setdefault(name, []).append(elapsed)
+
+    def connect(self, app: Flask) -> None:
+        before_render_template.connect(self._before_render, app)
+        template_rendered.connect(self._rendered, app)
+
+    def disconnect(self, app: Flask) -> None:
+        before_render_template.disconnect(self._before_render, app)
+        template_rendered.disconnect(self._rendered, app)
+
+    def pop_timings(self) -> tuple[Timings, Timings]:  # pragma: no cover
+        """Return and forget the URL and template timings."""
+        # Runs in worker processes.
+        urls, templates = self.urls, self.templates
+        self.urls, self.templates = {}, {}
+        return urls, templates
+
+    def merge(self, urls: Timings, templates: Timings) -> None:
+        """Add timings recorded in a worker process."""
+        for url, durations in urls.items():
+            self.urls.setdefault(url, []).extend(durations)
+        for name, durations in templates.items():
+            self.templates.setdefault(name, []).extend(durations)
+
+    def to_dict(self) -> dict[str, typing.Any]:
+        return {
+            'stages': self.stages,
+            'urls': {url: sum(durations) for url, durations in self.urls.items()},
+            'templates': {
+                name: {'count': len(durations), 'total': sum(durations)}
+                for name, durations in self.templates.items()
+            },
+        }
+
+    def report(self, top: int) -> list[str]:
+        """Lines describing the stages and the slowest URLs and templates."""
+        data = self.to_dict()
+        lines = ['Stage                 wall (s)   cpu (s)']
+        for name, timing in data['stages'].items():
+            lines.append(f'{name:<20}{timing["wall"]:>10.3f}{timing["cpu"]:>10.3f}')
+
+        urls = sorted(data['urls'].items(), key=lambda item: item[1], reverse=True)
+        lines.append(f'Slowest URLs ({len(urls)} frozen)')
+        lines.extend(f'{seconds:>10.3f}  {url}' for url, seconds in urls[:top])
+
+        templates = sorted(
+            data['templates'].items(),
+            key=lambda item: item[1]['total'],
+            reverse=True,
+        )
+        lines.append(f'Slowest templates ({len(templates)} rendered)')
+        lines.extend(
+            f'{timing["total"]:>10.3f}  {name} ({timing["count"]} renders)'
+            for name, timing in templates[:top]
+        )
+        return lines
+
+    def save(self, path: Path) -> None:
+        path.write_text(json.dumps(self.to_dict(), indent=2))
@@ -0,0 +1,51 @@
+from collections.abc import Iterable
+import functools
+import re
+
+from csscompressor import compress
+from flask_flatpages import Page, pygments_style_defs
+
+
+SPAN_CLASS_RE = re.compile(r'<span class="([^"]+)"')
+# pygments_style_defs() uses the class of the codehilite markdown extension
+TOKEN_RULE_RE = re.compile(r'^\.codehilite \.([\w-]+) ')
+
+
+def get_code_classes(posts: Iterable[Page]) -> frozenset[str]:
+    """Return the classes of the tokens Pygments highlighted in the posts."""
+    classes: set[str] = set()
+    for post in posts:
+        if 'codehilite' not in post.html:
+            continue
+        for match in SPAN_CLASS_RE.finditer(post.html):
+            classes.update(match.group(1).split())
+    return frozenset(classes)
+
+
+@functools.cache
+def get_style_defs(style: str) -> list[str]:
+    return pygments_style_defs(style).splitlines()
+
+
+@functools.lru_cache(maxsize=16)
+def get_pygments_css(
+    style: str,
+    code_classes: frozenset[str],
+    *,
+    minify: bool,
+) -> str:
+    """
+    Return the CSS of a Pygments style for the tokens in `code_classes`.
+
+    Rules for tokens that are not in any code block are left out.
+    """
+    lines = []
+    for line in get_style_defs(style):
+        match = TOKEN_RULE_RE.match(line)
+        if match and match.group(1) not in code_classes:
+            continue
+        lines.append(line)
+    css = '\n'.join(lines) + '\n'
+    if minify:
+        return compress(css)
+    return css
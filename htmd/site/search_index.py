@@ -0,0 +1,89 @@
+import hashlib
+from importlib.metadata import version
+import json
+from pathlib import Path
+import shutil
+
+from pagefind.index import IndexConfig
+
+from ..utils import atomic_write
+
+
+SEARCH_INDEX_FILE = 'search-index.json'
+
+# source path relative to the site -> hash of the HTML
+PageDigests = dict[str, str]
+
+
+def get_options_digest(config: IndexConfig) -> str:
+    """Hash the Pagefind options, including the exclude selectors."""
+    hash_obj = hashlib.sha256()
+    hash_obj.update(version('pagefind').encode('utf-8'))
+    hash_obj.update(json.dumps(config, sort_keys=True).encode('utf-8'))
+    return hash_obj.hexdigest()
+
+
+def get_page_digest(content: str) -> str:
+    return hashlib.sha256(content.encode('utf-8')).hexdigest()
+
+
+def index_is_intact(output: Path) -> bool:
+    """Check the files written by Pagefind are still in `output`."""
+    try:
+        entry = json.loads((output / 'pagefind-entry.json').read_text())
+    except (FileNotFoundError, json.JSONDecodeError):
+        return False
+    return all(
+        (output / f'pagefind.{language["hash"]}.pf_meta').is_file()
+        for language in entry['languages'].values()
+    )
+
+
+def remove_index(output: Path) -> None:
+    """Remove the previous index so none of its files are left behind."""
+    shutil.rmtree(output, ignore_errors=True)
+
+
+class SearchIndexDigests:
+    """
+    Record the pages in the search index of the last build.
+
+    The index only needs to be written again
+    when a page or the Pagefind options have changed.
+    """
+
+    def __init__(self, cache_folder: Path, config: IndexConfig) -> None:
+        self.path = cache_folder / SEARCH_INDEX_FILE
+        self.output = Path(config.get('output_path') or 'pagefind')
+        self.options = get_options_digest(config)
+        self.previous: PageDigests = self._load()
+
+    def _load(self) -> PageDigests:
+        try:
+            data = json.loads(self.path.read_text())
+        except (FileNotFoundError, json.JSONDecodeError):
+            return {}
+        if data.get('options') != self.options:
+            return {}
+        if not index_is_intact(self.output):
+            return {}
+        pages: PageDigests = data.get('pages', {})
+        return pages
+
+    def save(self, pages: PageDigests) -> None:
+        data = {
+            'options': self.options,
+            'pages': pages,
+        }
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        atomic_write(self.path, json.dumps(data))
+
+
+def get_site_digests(site: Path, output: Path) -> PageDigests:
+    """Hash the pages Pagefind will index in `site`."""
+    return {
+        path.relative_to(site).as_posix(): get_page_digest(path.read_text())
+        for path in sorted(site.rglob('*.html'))
+        if not path.is_relative_to(output)
+    }
+
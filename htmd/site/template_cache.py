@@ -0,0 +1,65 @@
+from concurrent.futures import ProcessPoolExecutor
+import multiprocessing
+from pathlib import Path
+
+from flask import Flask
+from jinja2 import FileSystemBytecodeCache, TemplateSyntaxError
+
+
+JINJA_CACHE_FOLDER = 'jinja'
+
+
+def set_bytecode_cache(app: Flask) -> None:
+    """
+    Keep compiled templates in CACHE_FOLDER for the next build or preview.
+
+    Jinja compiles a template again when its source has changed.
+    """
+    cache_folder = Path(app.config['CACHE_FOLDER']) / JINJA_CACHE_FOLDER
+    cache_folder.mkdir(parents=True, exist_ok=True)
+    app.jinja_env.bytecode_cache = FileSystemBytecodeCache(str(cache_folder))
+
+
+def compile_template(app: Flask, name: str) -> str | None:
+    """Compile a template into the bytecode cache, return the syntax error."""
+    try:
+        app.jinja_env.get_template(name)
+    except TemplateSyntaxError as exc:
+        return f'Template {exc.filename or name} line {exc.lineno}: {exc.message}'
+    return None
+
+
+_worker_app: Flask | None = None
+
+
+def _init_worker(app: Flask) -> None:  # pragma: no cover
+    # Runs in worker processes.
+    global _worker_app  # noqa: PLW0603
+    _worker_app = app
+
+
+def _compile_template(name: str) -> str | None:  # pragma: no cover
+    # Runs in worker processes.
+    assert _worker_app is not None
+    return compile_template(_worker_app, name)
+
+
+def precompile_templates(app: Flask, jobs: int) -> list[str]:
+    """
+    Compile every template and page in `jobs` processes.
+
+    Return the syntax errors so they are found before freezing.
+    """
+    names = app.jinja_env.list_templates(extensions=['html'])
+    if jobs == 1:
+        errors = [compile_template(app, name) for name in names]
+    else:
+        context = multiprocessing.get_context('fork')
+        with ProcessPoolExecutor(
+            jobs,
+            mp_context=context,
+            initializer=_init_worker,
+            initargs=(app,),
+        ) as executor:
+            errors = list(executor.map(_compile_template, names))
+    return [error for error in errors if error]
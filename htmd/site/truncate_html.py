@@ -0,0 +1,140 @@
+from html import unescape
+from html.entities import html5
+from html.parser import HTMLParser
+
+from .pretty_html import (
+    CDATA_TAGS,
+    escape,
+    format_attributes,
+    PRESERVE_WHITESPACE_TAGS,
+    VOID_TAGS,
+)
+
+
+SUFFIX = '...'
+ASCII_WHITESPACE = ' \t\n\f\r'
+
+
+class TruncatedError(Exception):
+    """Raised to stop parsing once the truncated HTML is known."""
+
+
+class Truncator(HTMLParser):
+    """
+    Copy HTML until `limit` characters of text, then close the open tags.
+
+    The text that does not fit is replaced with '...'.
+    When the text is at most len('...') longer than `limit`
+    the whole HTML is kept, so parsing stops
+    once there are more than `limit` + len('...') characters of text.
+    Tags and text are written like BeautifulSoup(html, 'html.parser').decode(),
+    unlike BeautifulSoup comments, declarations, scripts, and styles
+    are not counted as text and are never truncated.
+    """
+
+    def __init__(self, limit: int) -> None:
+        super().__init__(convert_charrefs=False)
+        self.limit = limit
+        self.pieces: list[str] = []
+        self.open_tags: list[str] = []
+        self.text: list[str] = []
+        self.text_length = 0
+        self.truncated: str | None = None
+
+    def write_text(self) -> None:
+        if not self.text:
+            return
+        text = ''.join(self.text)
+        self.text.clear()
+        if self.open_tags and self.open_tags[-1] in CDATA_TAGS:
+            # Scripts and styles are not text
+            self.pieces.append(text)
+            return
+        if not text.strip(ASCII_WHITESPACE) and not (
+            PRESERVE_WHITESPACE_TAGS.intersection(self.open_tags)
+        ):
+            text = '\n' if '\n' in text else ' '
+
+        if self.truncated is None and self.text_length + len(text) > self.limit:
+            kept = text[:self.limit - self.text_length].rstrip() + SUFFIX
+            closing = ''.join(f'</{tag}>' for tag in reversed(self.open_tags))
+            self.truncated = ''.join(self.pieces) + escape(kept) + closing
+        self.text_length += len(text)
+        if self.text_length - self.limit > len(SUFFIX):
+            raise TruncatedError
+        self.pieces.append(escape(text))
+
+    def write_markup(self, piece: str) -> None:
+        self.write_text()
+        self.pieces.append(piece)
+
+    def close_tag(self) -> None:
+        self.pieces.append(f'</{self.open_tags.pop()}>')
+
+    def handle_starttag(self, tag: str, attrs: list[tuple[str, str | None]]) -> None:
+        self.write_text()
+        attributes = format_attributes(tag, attrs)
+        if tag in VOID_TAGS:
+            self.pieces.append(f'<{tag}{attributes}/>')
+        else:
+            self.pieces.append(f'<{tag}{attributes}>')
+            self.open_tags.append(tag)
+
+    def handle_startendtag(
+        self,
+        tag: str,
+        attrs: list[tuple[str, str | None]],
+    ) -> None:
+        self.handle_starttag(tag, attrs)
+        if tag not in VOID_TAGS:
+            self.close_tag()
+
+    def handle_endtag(self, tag: str) -> None:
+        self.write_text()
+        if tag in VOID_TAGS or tag not in self.open_tags:
+            return
+        while self.open_tags[-1] != tag:
+            self.close_tag()
+        self.close_tag()
+
+    def handle_data(self, data: str) -> None:
+        self.text.append(data)
+
+    def handle_entityref(self, name: str) -> None:
+        self.text.append(html5.get(f'{name};', f'&{name}'))
+
+    def handle_charref(self, name: str) -> None:
+        self.text.append(unescape(f'&#{name};'))
+
+    def handle_comment(self, data: str) -> None:
+        self.write_markup(f'<!--{data}-->')
+
+    def handle_decl(self, decl: str) -> None:
+        self.write_markup(f'<!DOCTYPE {decl[len("DOCTYPE "):]}>\n')
+
+    def handle_pi(self, data: str) -> None:
+        self.write_markup(f'<?{data}>')
+
+    def unknown_decl(self, data: str) -> None:
+        if data.upper().startswith('CDATA['):
+            self.write_markup(f'<![CDATA[{data[len("CDATA["):]}]]>')
+        else:
+            self.write_markup(f'<?{data}?>')
+
+    def close(self) -> None:
+        super().close()
+        self.write_text()
+        while self.open_tags:
+            self.close_tag()
+
+
+def truncate_html(html: str, limit: int) -> str:
+    """Return html with the text after `limit` characters removed."""
+    truncator = Truncator(limit)
+    try:
+        truncator.feed(html)
+        truncator.close()
+    except TruncatedError:
+        assert truncator.truncated is not None
+        return truncator.truncated
+    return ''.join(truncator.pieces)
@@ -1,10 +1,17 @@
+from collections.abc import Iterable, Iterator
+from concurrent.futures import ProcessPoolExecutor
+import contextlib
 import datetime
 import hashlib
+from importlib.metadata import version
 from importlib.resources import as_file, files
+import json
+import multiprocessing
 import os
 from pathlib import Path
 import shutil
 import tempfile
+import typing
 import uuid
 
 import click
@@ -13,10 +20,19 @@ from flask import Flask
 from flask_flatpages import Page
 from jsmin import jsmin
 
-from .password_protect import generate_private_key
+from .password_protect import generate_passwords, KeyPool
+from .site.assets import AssetManifest
 from .site.posts import get_posts
 
 
+MINIFIED_STATIC_FOLDER = 'minified-static'
+# Distribution that minifies each extension
+MINIFIERS = {
+    '.css': 'csscompressor',
+    '.js': 'jsmin',
+}
+
+
 def atomic_write(path: Path, content: str) -> None:
     """
     Write content to a file using an atomic move.
@@ -45,6 +61,23 @@ def atomic_write(path: Path, content: str) -> None:
         raise
 
 
+def prune_cache(cache_folder: Path, used: Iterable[Path]) -> None:
+    """
+    Remove the files in `cache_folder` that are not in `used`.
+
+    Cache files are named by the hash of their inputs, in `key[:2]/` folders,
+    a file is not used again once its inputs change.
+    """
+    used_paths = set(used)
+    for path in cache_folder.glob('*/*'):
+        if path not in used_paths:
+            path.unlink()
+    for folder in cache_folder.glob('*'):
+        # Only empty folders are removed
+        with contextlib.suppress(OSError):
+            folder.rmdir()
+
+
 def create_directory(name: str) -> Path:
     directory = Path(name)
     try:
@@ -101,73 +134,157 @@ def get_static_files(directory: Path, extension: str) -> list[Path]:
     return sorted(results)
 
 
-def minify_css_file(src_root: Path, file_path: Path, dst_root: Path) -> Path:
-    if '.min' in file_path.stem:
-        rel = file_path.relative_to(src_root)
-        dst = dst_root / rel
-        shutil.copyfile(file_path, dst)
-        return dst
+def minify_text(file_path: Path) -> str:
     text = file_path.read_text()
-    minified_text = compress(text)
-    # compute path of file relative to source root
-    rel = file_path.relative_to(src_root)
-    rel = rel.with_name(rel.name.replace('.css', '.min.css'))
-    dst = dst_root / rel
-    dst.parent.mkdir(parents=True, exist_ok=True)
-    atomic_write(dst, minified_text)
-    return dst
+    # Already minified
+    if '.min' in file_path.stem:
+        return text
+    if file_path.suffix == '.css':
+        return compress(text)
+    return jsmin(text)
 
 
-def minify_js_file(src_root: Path, file_path: Path, dst_root: Path) -> Path:
-    if '.min' in file_path.stem:
-        rel = file_path.relative_to(src_root)
-        dst = dst_root / rel
-        shutil.copyfile(file_path, dst)
-        return dst
-    text = file_path.read_text()
-    minified_text = jsmin(text)
+def _minify_text(file_path: Path) -> str:  # pragma: no cover
+    # Runs in worker processes.
+    return minify_text(file_path)
+
+
+def get_minified_cache_path(cache_folder: Path, file_path: Path) -> Path:
+    """Return where the minified file is kept, by the hash of the file."""
+    hash_obj = hashlib.sha256()
+    hash_obj.update(version(MINIFIERS[file_path.suffix]).encode('utf-8'))
+    hash_obj.update(b'\x00')
+    hash_obj.update(file_path.read_bytes())
+    key = hash_obj.hexdigest()
+    suffix = file_path.suffix
+    return cache_folder / MINIFIED_STATIC_FOLDER / key[:2] / f'{key}{suffix}'
+
+
+def get_minified_texts(
+    file_paths: list[Path],
+    cache_folder: Path | None = None,
+    jobs: int = 1,
+) -> list[str]:
+    """
+    Return the minified text of each CSS or JavaScript file.
+
+    Minified text is kept in `cache_folder` by the hash of the file,
+    so a file is only minified again when it changes.
+    Files that are not in the cache are minified in `jobs` processes.
+    """
+    texts: dict[Path, str] = {}
+    cache_paths: dict[Path, Path] = {}
+    for file_path in file_paths:
+        if '.min' in file_path.stem:
+            texts[file_path] = file_path.read_text()
+            continue
+        if cache_folder is None:
+            continue
+        cache_path = get_minified_cache_path(cache_folder, file_path)
+        try:
+            texts[file_path] = cache_path.read_text()
+        except FileNotFoundError:
+            cache_paths[file_path] = cache_path
+
+    missing = [file_path for file_path in file_paths if file_path not in texts]
+    if jobs == 1 or len(missing) <= 1:
+        minified = [minify_text(file_path) for file_path in missing]
+    else:
+        context = multiprocessing.get_context('fork')
+        workers = min(jobs, len(missing))
+        with ProcessPoolExecutor(workers, mp_context=context) as executor:
+            minified = list(executor.map(_minify_text, missing))
+
+    for file_path, text in zip(missing, minified, strict=True):
+        texts[file_path] = text
+        if file_path in cache_paths:
+            cache_path = cache_paths[file_path]
+            cache_path.parent.mkdir(parents=True, exist_ok=True)
+            atomic_write(cache_path, text)
+    return [texts[file_path] for file_path in file_paths]
+
+
+def get_minified_path(src_root: Path, file_path: Path) -> Path:
+    """Return the path of the minified file relative to the destination."""
     # compute path of file relative to source root
     rel = file_path.relative_to(src_root)
-    rel = rel.with_name(rel.name.replace('.js', '.min.js'))
+    if '.min' in file_path.stem:
+        return rel
+    suffix = file_path.suffix
+    return rel.with_name(rel.name.replace(suffix, f'.min{suffix}'))
+
+
+def prune_minified_cache(cache_folder: Path, file_paths: list[Path]) -> None:
+    """Remove the minified files in `cache_folder` that are not of `file_paths`."""
+    prune_cache(
+        cache_folder / MINIFIED_STATIC_FOLDER,
+        (
+            get_minified_cache_path(cache_folder, file_path)
+            for file_path in file_paths
+            if '.min' not in file_path.stem
+        ),
+    )
+
+
+def write_minified_file(
+    dst_root: Path,
+    rel: Path,
+    minified_text: str,
+    assets: AssetManifest | None,
+) -> Path:
+    if assets is not None:
+        rel = Path(assets.add(rel.as_posix(), minified_text.encode('utf-8')))
     dst = dst_root / rel
+    # Unchanged files are not written again
+    with contextlib.suppress(FileNotFoundError):
+        if dst.read_text() == minified_text:
+            return dst
     dst.parent.mkdir(parents=True, exist_ok=True)
     atomic_write(dst, minified_text)
     return dst
 
 
-def minify_css_files(
-    source_root_folder: Path,
-    source_files: list[Path],
-    destination_root_folder: Path,
-) -> list[str]:
-    minified_files = []
-    for css_file in source_files:
-        full_path = minify_css_file(
-            source_root_folder,
-            css_file,
-            destination_root_folder,
-        )
-        # record path relative to destination root (preserves subdirs)
-        rel = full_path.relative_to(destination_root_folder)
-        minified_files.append(rel.as_posix())
-    return minified_files
+def minify_static_file(
+    src_root: Path,
+    file_path: Path,
+    dst_root: Path,
+    assets: AssetManifest | None = None,
+    cache_folder: Path | None = None,
+) -> Path:
+    """
+    Write the minified `file_path` to `dst_root`.
+
+    With `assets` the file name gets a hash of the minified file.
+    """
+    [minified_text] = get_minified_texts([file_path], cache_folder)
+    rel = get_minified_path(src_root, file_path)
+    return write_minified_file(dst_root, rel, minified_text, assets)
 
 
-def minify_js_files(
+def minify_static_files(  # noqa: PLR0913
     source_root_folder: Path,
     source_files: list[Path],
     destination_root_folder: Path,
+    assets: AssetManifest | None = None,
+    *,
+    cache_folder: Path | None = None,
+    jobs: int = 1,
 ) -> list[str]:
+    minified_texts = get_minified_texts(source_files, cache_folder, jobs)
     minified_files = []
-    for js_file in source_files:
-        full_path = minify_js_file(
-            source_root_folder,
-            js_file,
+    for source_file, minified_text in zip(source_files, minified_texts, strict=True):
+        full_path = write_minified_file(
             destination_root_folder,
+            get_minified_path(source_root_folder, source_file),
+            minified_text,
+            assets,
         )
         # record path relative to destination root (preserves subdirs)
-        rel = full_path.relative_to(destination_root_folder)
-        minified_files.append(rel.as_posix())
+        rel = full_path.relative_to(destination_root_folder).as_posix()
+        if assets is not None:
+            # Templates use the name, url_for() adds the hash
+            rel = assets.logical_names[rel]
+        minified_files.append(rel)
     return minified_files
 
 
@@ -271,34 +388,31 @@ def send_stderr(message: str) -> None:
     click.secho(message, fg='red', err=True)
 
 
-def validate_post(  # noqa: C901
+def get_post_errors(
     post: Page,
     required_fields: list[str],
-) -> bool:
-    correct = True
-    for field in required_fields:
-        if field not in post.meta:
-            correct = False
-            msg = f'Post "{post.path}" does not have field {field}.'
-            send_stderr(msg)
+) -> list[str]:
+    errors = [
+        f'Post "{post.path}" does not have field {field}.'
+        for field in required_fields
+        if field not in post.meta
+    ]
     if 'published' in post.meta:
         published = post.meta.get('published')
         if not hasattr(published, 'year'):
-            correct = False
             msg = (
                 f'Published date {published} for {post.path}'
                 ' is not in the format YYYY-MM-DD.'
             )
-            send_stderr(msg)
+            errors.append(msg)
     if 'updated' in post.meta:
         updated = post.meta.get('updated')
         if not hasattr(updated, 'year'):
-            correct = False
             msg = (
                 f'Updated date {updated} for {post.path}'
                 ' is not in the format YYYY-MM-DD.'
             )
-            send_stderr(msg)
+            errors.append(msg)
     if 'draft' in post.meta:
         draft = post.meta['draft']
         if draft in {True, False, 'build'}:
@@ -306,22 +420,30 @@ def validate_post(  # noqa: C901
         elif 'build|' in draft:
             draft_id = draft.split('|')[1]
             if not valid_uuid(draft_id):
-                correct = False
                 msg = (
                     f'Draft field {draft} for {post.path}'
                     ' has an invalid UUID4.'
                 )
-                send_stderr(msg)
+                errors.append(msg)
         else:
-            correct = False
             msg = (
                 f'Draft field {draft} for {post.path}'
                 ' is not valid. It must be True, False,'
                 ' "build", or "build|<UUID4>".'
             )
-            send_stderr(msg)
+            errors.append(msg)
+
+    return errors
 
-    return correct
+
+def validate_post(
+    post: Page,
+    required_fields: list[str],
+) -> bool:
+    errors = get_post_errors(post, required_fields)
+    for msg in errors:
+        send_stderr(msg)
+    return not errors
 
 
 def _get_published(
@@ -353,9 +475,12 @@ def _get_published(
     return now
 
 
-def get_post_hash(post: Page) -> str:
+# Prefix of `_hash` values computed from the post source
+POST_HASH_PREFIX = 'source:'
+
+
+def _get_post_hash_fields(post: Page) -> tuple[str, ...]:
     title = post.meta.get('title', '')
-    contents = post.html
     author = post.meta.get('author', '')
     tags = post.meta.get('tags', [])
     tags_str = ','.join(sorted(str(t) for t in tags))
@@ -365,6 +490,38 @@ def get_post_hash(post: Page) -> str:
     draft_raw = str(post.meta.get('draft', ''))
     # Only use the value up until '|'
     draft_val = draft_raw.split('|', maxsplit=1)[0].strip()
+    return (
+        title,
+        date_str,
+        author,
+        tags_str,
+        image,
+        draft_val,
+    )
+
+
+def get_post_hash(post: Page) -> str:
+    """
+    Hash the front matter fields and the Markdown source of a post.
+
+    The post is not rendered.
+    """
+    hash_obj = hashlib.sha256()
+    for field in _get_post_hash_fields(post):
+        hash_obj.update(field.encode('utf-8'))
+        hash_obj.update(b'\x00')
+    hash_obj.update(post.body.encode('utf-8'))
+    return POST_HASH_PREFIX + hash_obj.hexdigest()
+
+
+def get_legacy_post_hash(post: Page) -> str:
+    """
+    Hash a post the way `_hash` was computed before POST_HASH_PREFIX.
+
+    The rendered HTML is hashed so the post is rendered.
+    """
+    title, date_str, author, tags_str, image, draft_val = _get_post_hash_fields(post)
+    contents = post.html
 
     hash_obj = hashlib.sha256()
 
@@ -391,8 +548,176 @@ def get_post_hash(post: Page) -> str:
     return hex_result
 
 
+def post_hash_changed(post: Page, post_hash: str) -> bool:
+    """
+    Check if `_hash` of a post is different from `post_hash`.
+
+    A `_hash` from before POST_HASH_PREFIX is compared with the legacy hash
+    so the post is not considered changed when it is replaced.
+    """
+    current_hash = str(post.meta.get('_hash', ''))
+    if current_hash == post_hash:
+        return False
+    if current_hash and not current_hash.startswith(POST_HASH_PREFIX):
+        return current_hash != get_legacy_post_hash(post)
+    return True
+
+
+SYNC_STATE_FILE = 'sync-posts.json'
+
+
+class SyncState:
+    """
+    Remember the post files as they were after the last sync_posts.
+
+    A post file is only synced again when its size, modification time,
+    or inode have changed.
+    Files modified at or after the state was saved are always synced
+    since a later change in the same timestamp tick would not be noticed.
+    """
+
+    def __init__(self, app: Flask) -> None:
+        self.app = app
+        self.path = Path(app.config['CACHE_FOLDER']) / SYNC_STATE_FILE
+        self.options = f'{version("htmd")}|{POST_HASH_PREFIX}'
+        self.saved_ns = 0
+        self.previous: dict[str, dict[str, typing.Any]] = self._load()
+        self.files: dict[str, dict[str, typing.Any]] = {}
+
+    def _load(self) -> dict[str, dict[str, typing.Any]]:
+        try:
+            data = json.loads(self.path.read_text())
+            self.saved_ns = self.path.stat().st_mtime_ns
+        except (FileNotFoundError, json.JSONDecodeError):
+            return {}
+        if data.get('options') != self.options:
+            return {}
+        files: dict[str, dict[str, typing.Any]] = data.get('files', {})
+        return files
+
+    def _stat(self, post: Page) -> os.stat_result:
+        post_folder = Path(self.app.config['FLATPAGES_ROOT'])
+        file_extension = self.app.config['FLATPAGES_EXTENSION']
+        return (post_folder / f'{post.path}{file_extension}').stat()
+
+    def unchanged(self, post: Page) -> bool:
+        entry = self.previous.get(post.path)
+        if entry is None:
+            return False
+        stat = self._stat(post)
+        if (
+            entry['size'] != stat.st_size
+            or entry['mtime_ns'] != stat.st_mtime_ns
+            or entry['inode'] != stat.st_ino
+            or stat.st_mtime_ns >= self.saved_ns
+        ):
+            return False
+        self.files[post.path] = entry
+        return True
+
+    def record(self, post: Page) -> None:
+        stat = self._stat(post)
+        self.files[post.path] = {
+            'size': stat.st_size,
+            'mtime_ns': stat.st_mtime_ns,
+            'inode': stat.st_ino,
+            'hash': post.meta.get('_hash', ''),
+        }
+
+    def save(self) -> None:
+        data = {
+            'options': self.options,
+            'files': self.files,
+        }
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        atomic_write(self.path, json.dumps(data))
+
+
+def needs_password(post: Page) -> bool:
+    return 'password' in post.meta and post.meta['password'] in ('', None, True)
+
+
+def _sync_post(
+    app: Flask,
+    post: Page,
+    now: datetime.datetime,
+    passwords: Iterator[str],
+) -> bool:
+    """Sync a post, return False if a change was not written to the file."""
+    file_updates: dict[str, str] = {}
+    if needs_password(post):
+        post.meta['password'] = file_updates['password'] = next(passwords)
+
+    if post.meta.get('draft', False):
+        if (
+            'build' in str(post.meta['draft'])
+            and not valid_uuid(
+                post.meta['draft'].replace('build|', ''),
+            )
+        ):
+            post.meta['draft'] = 'build|' + str(uuid.uuid4())
+            file_updates['draft'] = post.meta['draft']
+            set_post_metadata(
+                app,
+                post,
+                file_updates,
+            )
+            return True
+        # A generated password is not written to a draft
+        return not file_updates
+
+    current_published = post.meta.get('published')
+    current_updated = post.meta.get('updated')
+    current_hash = post.meta.get('_hash', '')
+    published = _get_published(
+        current_published,
+        current_updated,
+        now,
+    )
+
+    post_hash = get_post_hash(post)
+
+    hash_changed = post_hash_changed(post, post_hash)
+
+    if current_hash != post_hash:
+        post.meta['_hash'] = post_hash
+        file_updates['_hash'] = post.meta['_hash']
+    if published != current_published:
+        post.meta['published'] = published
+        file_updates['published'] = published.isoformat()
+    post_already_published = (
+        isinstance(current_published, datetime.datetime)
+        or isinstance(current_updated, datetime.datetime)
+    )
+    if hash_changed and post_already_published:
+        post.meta['updated'] = now
+        file_updates['updated'] = now.isoformat()
+    elif (
+        not isinstance(current_updated, datetime.datetime)
+        and isinstance(current_updated, datetime.date)
+    ):
+        updated = datetime.datetime.combine(
+            current_updated,
+            datetime.time.min,
+            tzinfo=datetime.UTC,
+        )
+        post.meta['updated'] = updated
+        file_updates['updated'] = updated.isoformat()
+
+    if file_updates:
+        set_post_metadata(
+            app,
+            post,
+            file_updates,
+        )
+    return True
+
+
 def sync_posts(
     app: Flask,
+    *,
+    jobs: int = 1,
+    key_pool: KeyPool | None = None,
 ) -> None:
     """
     Sync draft, published, updated, and _hash for each post.
@@ -409,74 +734,28 @@ def sync_posts(
 
     If updated is a date, convert to datetime.
 
-    Set hash using title and post contents.
+    Set hash using the front matter and Markdown source of the post.
+    A `_hash` from an older version is replaced without setting updated.
+
+    Post files that have not changed since the last sync are skipped.
+
+    Passwords for password protected posts are taken from `key_pool`
+    or generated in `jobs` processes.
     """
     now = datetime.datetime.now(tz=datetime.UTC)
     posts = get_posts(app)
+    state = SyncState(app)
+    changed = [post for post in posts if not state.unchanged(post)]
+    count = sum(needs_password(post) for post in changed)
+    if key_pool:
+        passwords = iter(key_pool.get(count))
+    else:
+        passwords = iter(generate_passwords(count, jobs))
     with app.app_context():
-        for post in posts:
-            file_updates: dict[str, str] = {}
-            if 'password' in post.meta and (post.meta['password'] in ('', None, True)):
-                _, password = generate_private_key()
-                post.meta['password'] = file_updates['password'] = password
-
-            if post.meta.get('draft', False):
-                if (
-                    'build' in str(post.meta['draft'])
-                    and not valid_uuid(
-                        post.meta['draft'].replace('build|', ''),
-                    )
-                ):
-                    post.meta['draft'] = 'build|' + str(uuid.uuid4())
-                    file_updates['draft'] = post.meta['draft']
-                    set_post_metadata(
-                        app,
-                        post,
-                        file_updates,
-                    )
-                continue
+        for post in changed:
+            if _sync_post(app, post, now, passwords):
+                state.record(post)
+    state.save()
 
-            current_published = post.meta.get('published')
-            current_updated = post.meta.get('updated')
-            current_hash = post.meta.get('_hash', '')
-            published = _get_published(
-                current_published,
-                current_updated,
-                now,
-            )
-
-            post_hash = get_post_hash(post)
-
-            hash_changed = current_hash != post_hash
-
-            if hash_changed:
-                post.meta['_hash'] = post_hash
-                file_updates['_hash'] = post.meta['_hash']
-            if published != current_published:
-                post.meta['published'] = published
-                file_updates['published'] = published.isoformat()
-            post_already_published = (
-                isinstance(current_published, datetime.datetime)
-                or isinstance(current_updated, datetime.datetime)
-            )
-            if hash_changed and post_already_published:
-                post.meta['updated'] = now
-                file_updates['updated'] = now.isoformat()
-            elif (
-                not isinstance(current_updated, datetime.datetime)
-                and isinstance(current_updated, datetime.date)
-            ):
-                updated = datetime.datetime.combine(
-                    current_updated,
-                    datetime.time.min,
-                    tzinfo=datetime.UTC,
-                )
-                post.meta['updated'] = updated
-                file_updates['updated'] = updated.isoformat()
-
-            if file_updates:
-                set_post_metadata(
-                    app,
-                    post,
-                    file_updates,
-                )
+    # Posts that were just published need to be in the archive
+    posts.reindex()
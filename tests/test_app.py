@@ -1,8 +1,11 @@
+from pathlib import Path
 import threading
 import time
 
 from flask import Flask
 from flask.testing import FlaskClient
+from htmd import site
+from htmd.utils import sync_posts
 import pytest
 
 from utils import set_example_to_draft
@@ -109,3 +112,19 @@ def test_changes_view_event_stream(flask_app: Flask) -> None:
         b'data: refresh\n\n',
     ]
     assert changes == expected
+
+
+def test_freeze_without_manifest(flask_app: Flask) -> None:
+    # Every page is rendered when the freezer has no build manifest
+    assert site.freezer.manifest is None
+    sync_posts(flask_app)
+    site.freezer.freeze()
+    post_path = Path('build') / '2014' / '10' / '30' / 'example' / 'index.html'
+    assert post_path.is_file()
+
+
+def test_html_not_minified(flask_app: Flask, client: FlaskClient) -> None:
+    # HTML is only minified by htmd build
+    flask_app.config['MINIFY_HTML'] = True
+    response = client.get('/')
+    assert '\n  <meta charset="utf-8">\n' in response.get_data(as_text=True)
@@ -1,3 +1,4 @@
+import json
 import os
 from pathlib import Path
 import re
@@ -6,11 +7,13 @@ import shutil
 from click.testing import CliRunner
 from htmd.cli.build import build
 from htmd.utils import atomic_write
+import pytest
 import yaml
 
 from utils import (
     remove_fields_from_post,
     set_config_field,
+    set_example_contents,
     set_example_password_value,
     set_example_subtitle,
     set_example_to_draft,
@@ -83,6 +86,94 @@ def test_build_css_minify(run_start: CliRunner) -> None:
     ]
 
 
+def test_build_fingerprint(run_start: CliRunner) -> None:
+    result = run_start.invoke(build, ['--fingerprint'])
+    assert result.exit_code == 0
+    assert re.search(SUCCESS_REGEX, result.output)
+
+    manifest_path = Path('build') / 'static' / 'asset-manifest.json'
+    manifest = json.loads(manifest_path.read_text())
+    assert sorted(manifest) == [
+        '_reset.min.css',
+        'htmd.css',
+        'htmd.js',
+        'password-protect.js',
+        'pygments.css',
+        'style.min.css',
+    ]
+    assert re.fullmatch(r'style\.[0-9a-f]{10}\.min\.css', manifest['style.min.css'])
+    assert re.fullmatch(r'pygments\.[0-9a-f]{10}\.css', manifest['pygments.css'])
+
+    contents = (Path('build') / 'index.html').read_text()
+    for name in ('htmd.css', 'style.min.css', 'pygments.css', 'htmd.js'):
+        assert f'/static/{manifest[name]}"' in contents
+        assert (Path('build') / 'static' / manifest[name]).is_file()
+    assert '/static/style.min.css"' not in contents
+    assert not (Path('build') / 'static' / 'style.min.css').exists()
+
+    # A change in the CSS changes the name on every page
+    with (Path('static') / 'style.css').open('a') as css_file:
+        css_file.write('body { color: red; }\n')
+    result = run_start.invoke(build, ['--fingerprint'])
+    assert result.exit_code == 0
+    new_manifest = json.loads(manifest_path.read_text())
+    assert new_manifest['style.min.css'] != manifest['style.min.css']
+    assert new_manifest['htmd.css'] == manifest['htmd.css']
+    assert not (Path('build') / 'static' / manifest['style.min.css']).exists()
+    post_path = Path('build') / '2014' / '10' / '30' / 'example' / 'index.html'
+    assert new_manifest['style.min.css'] in post_path.read_text()
+
+
+def test_build_bundle(run_start: CliRunner) -> None:
+    set_config_field('static', 'bundle', 'true')
+    (Path('static') / 'app.js').write_text('const a = 1\n')
+    set_example_password_value('')
+    result = run_start.invoke(build)
+    assert result.exit_code == 0
+    assert re.search(SUCCESS_REGEX, result.output)
+
+    contents = (Path('build') / 'index.html').read_text()
+    stylesheets = re.findall(r'<link href="([^"]+)" rel="stylesheet">', contents)
+    assert stylesheets == ['/static/bundle.css']
+    scripts = re.findall(r'<script src="([^"]+)">', contents)
+    assert scripts == ['/static/bundle.js']
+
+    # The files are in the order of the <link> tags without bundling
+    css = (Path('build') / 'static' / 'bundle.css').read_text()
+    htmd_css = css.index('.heading-link-icon')
+    reset_css = css.index('html,body,div,span,')
+    style_css = css.index('*,*:before,*:after{box-sizing:border-box}')
+    pygments_css = css.index('.codehilite')
+    assert htmd_css < reset_css < style_css < pygments_css
+    js = (Path('build') / 'static' / 'bundle.js').read_text()
+    assert js.endswith('const a=1\n;\n')
+
+    # password-protect.js is only loaded by the protected post
+    assert 'password-protect.js' not in js
+    post_path = Path('build') / '2014' / '10' / '30' / 'example' / 'index.html'
+    scripts = re.findall(r'<script src="([^"]+)">', post_path.read_text())
+    assert scripts == ['/static/bundle.js', '/static/password-protect.js']
+
+
+def test_build_fingerprint_bundle(run_start: CliRunner) -> None:
+    set_config_field('static', 'bundle', 'true')
+    result = run_start.invoke(build, ['--fingerprint'])
+    assert result.exit_code == 0
+
+    manifest_path = Path('build') / 'static' / 'asset-manifest.json'
+    manifest = json.loads(manifest_path.read_text())
+    assert re.fullmatch(r'bundle\.[0-9a-f]{10}\.css', manifest['bundle.css'])
+    assert re.fullmatch(r'bundle\.[0-9a-f]{10}\.js', manifest['bundle.js'])
+    contents = (Path('build') / 'index.html').read_text()
+    stylesheets = re.findall(r'<link href="([^"]+)" rel="stylesheet">', contents)
+    assert stylesheets == [f'/static/{manifest["bundle.css"]}']
+
+    # The fingerprinted files are bundled
+    css = (Path('build') / 'static' / manifest['bundle.css']).read_text()
+    assert '*,*:before,*:after{box-sizing:border-box}' in css
+    assert not (Path('build') / 'static' / 'bundle.css').exists()
+
+
 def test_build_no_css_minify(run_start: CliRunner) -> None:
     result = run_start.invoke(build, ['--no-css-minify'])
     assert result.exit_code == 0
@@ -111,6 +202,26 @@ def test_build_html_pretty_true(run_start: CliRunner) -> None:
     assert re.search(SUCCESS_REGEX, result.output)
 
 
+def test_build_html_pretty_code_block(run_start: CliRunner) -> None:
+    set_config_field('html', 'pretty', 'true')
+    set_example_contents('Some *text*.\n\n```python\nif a < b:\n    pass\n```\n')
+
+    result = run_start.invoke(build)
+    assert result.exit_code == 0
+
+    # The home page has the post preview
+    contents = (Path('build') / 'index.html').read_text()
+    assert contents.startswith('<!DOCTYPE html>\n<html lang="en">\n <head>\n')
+    assert '<meta charset="utf-8"/>\n' in contents
+    paragraph = r'\n +<p>\n +Some\n +<em>\n +text\n +</em>\n +\.\n +</p>\n'
+    assert re.search(paragraph, contents)
+    # Whitespace in code blocks is kept
+    pre = re.search(r'\n +<pre>(.*?)</pre>\n +</div>\n', contents, re.DOTALL)
+    assert pre is not None
+    assert '&lt;' in pre.group(1)
+    assert '\n    <span class="k">pass</span>\n' in pre.group(1)
+
+
 def test_build_html_minify_true(run_start: CliRunner) -> None:
     set_config_field('html', 'minify', 'true')
 
@@ -119,6 +230,80 @@ def test_build_html_minify_true(run_start: CliRunner) -> None:
     assert re.search(SUCCESS_REGEX, result.output)
 
 
+def test_build_html_minify_post(run_start: CliRunner) -> None:
+    build_post = Path('build') / '2014' / '10' / '30' / 'example' / 'index.html'
+    result = run_start.invoke(build)
+    assert result.exit_code == 0
+    contents = build_post.read_text()
+
+    set_config_field('html', 'minify', 'true')
+    result = run_start.invoke(build, ['--jobs', '2'])
+    assert result.exit_code == 0
+    minified = build_post.read_text()
+    assert len(minified) < len(contents)
+    assert 'This is the post <strong>text</strong>.' in minified
+
+    # The minified HTML from the last build is used
+    minified_cache = Path('.htmd-cache') / 'minified-html'
+    cached = [
+        path
+        for path in minified_cache.rglob('*.html')
+        if path.read_text() == minified
+    ]
+    assert len(cached) == 1
+    cached[0].write_text('<p>From the cache.</p>')
+    result = run_start.invoke(build, ['--full'])
+    assert result.exit_code == 0
+    assert build_post.read_text() == '<p>From the cache.</p>'
+
+    # Unchanged pages are not minified again
+    mtime = build_post.stat().st_mtime_ns
+    result = run_start.invoke(build)
+    assert result.exit_code == 0
+    assert build_post.stat().st_mtime_ns == mtime
+
+
+def test_build_html_minify_cache_pruned(run_start: CliRunner) -> None:
+    set_config_field('html', 'minify', 'true')
+    minified_cache = Path('.htmd-cache') / 'minified-html'
+    minify_path = Path('.htmd-cache') / 'minify-html.json'
+
+    def cached_keys() -> set[str]:
+        return {path.stem for path in minified_cache.rglob('*.html')}
+
+    result = run_start.invoke(build)
+    assert result.exit_code == 0
+    keys = cached_keys()
+    assert keys == set(json.loads(minify_path.read_text())['keys'].values())
+
+    # Only the minified HTML of the last build is kept
+    set_example_contents('New text.')
+    result = run_start.invoke(build)
+    assert result.exit_code == 0
+    new_keys = cached_keys()
+    assert new_keys == set(json.loads(minify_path.read_text())['keys'].values())
+    assert new_keys != keys
+    assert len(new_keys) == len(keys)
+
+    # Unchanged post pages without a key are not kept
+    data = json.loads(minify_path.read_text())
+    del data['keys']
+    minify_path.write_text(json.dumps(data))
+    result = run_start.invoke(build)
+    assert result.exit_code == 0
+    assert cached_keys() < new_keys
+
+    # A different htmlmin version minifies every page again
+    data = json.loads(minify_path.read_text())
+    data['htmlmin'] = '0'
+    minify_path.write_text(json.dumps(data))
+    result = run_start.invoke(build)
+    assert result.exit_code == 0
+    keys = cached_keys()
+    assert keys == set(json.loads(minify_path.read_text())['keys'].values())
+    assert len(keys) == len(new_keys)
+
+
 def test_build_page_404(run_start: CliRunner) -> None:
     # Linking to a page that doesn't exist
     # will cause a 404 status code
@@ -622,6 +807,68 @@ def test_build_search_config(run_start: CliRunner) -> None:
     assert pagefind_path.is_dir()
 
 
+def test_build_search_subprocess(run_start: CliRunner) -> None:
+    set_config_field('pagefind', 'keep_index_url', True)  # noqa: FBT003
+    result = run_start.invoke(build)
+    assert re.search(SUCCESS_REGEX, result.output)
+    assert result.exit_code == 0
+    assert (Path('build') / 'pagefind' / 'pagefind-entry.json').is_file()
+
+    about_path = Path('pages') / 'about.html'
+    link = '''<p><a href="{{ url_for('pages.page', path='dne') }}">DNE</a></p>'''
+    contents = about_path.read_text()
+    about_path.write_text(
+        contents.replace('<p>This is the about page.</p>', link),
+    )
+    result = run_start.invoke(build)
+    assert result.exit_code == 1
+    assert "Unexpected status '404 NOT FOUND' on URL /dne/" in result.output
+
+
+def test_build_search_skipped_when_unchanged(run_start: CliRunner) -> None:
+    pagefind_path = Path('build') / 'pagefind'
+    result = run_start.invoke(build)
+    assert result.exit_code == 0
+    marker_path = pagefind_path / 'marker'
+    marker_path.write_text('')
+
+    # Nothing changed so the index is kept
+    result = run_start.invoke(build)
+    assert re.search(SUCCESS_REGEX, result.output)
+    assert result.exit_code == 0
+    assert marker_path.exists()
+
+    # A page changed
+    set_example_contents('New text.')
+    result = run_start.invoke(build)
+    assert result.exit_code == 0
+    assert not marker_path.exists()
+    assert (pagefind_path / 'pagefind-entry.json').is_file()
+
+    # The Pagefind options changed
+    marker_path.write_text('')
+    set_config_field('pagefind', 'keep_index_url', True)  # noqa: FBT003
+    result = run_start.invoke(build)
+    assert result.exit_code == 0
+    assert not marker_path.exists()
+
+    # The index is missing files
+    marker_path.write_text('')
+    for meta_path in pagefind_path.glob('*.pf_meta'):
+        meta_path.unlink()
+    result = run_start.invoke(build)
+    assert result.exit_code == 0
+    assert not marker_path.exists()
+    assert list(pagefind_path.glob('*.pf_meta'))
+
+    marker_path.write_text('')
+    (pagefind_path / 'pagefind-entry.json').unlink()
+    result = run_start.invoke(build)
+    assert result.exit_code == 0
+    assert not marker_path.exists()
+    assert (pagefind_path / 'pagefind-entry.json').is_file()
+
+
 def test_config_with_sub_section_as_value(run_start: CliRunner) -> None:
     # Remove [posts.author] section from config
     cfg_path = Path('config.toml')
@@ -745,3 +992,188 @@ def test_build_with_keep_files(run_start: CliRunner) -> None:
     assert result.exit_code == 0
     assert keep_file.is_file()
     assert keep_file.read_text() == 'www.example.com'
+
+
+def test_build_skips_unchanged_post(run_start: CliRunner) -> None:
+    post_path = Path('build') / '2014' / '10' / '30' / 'example' / 'index.html'
+    result = run_start.invoke(build)
+    assert result.exit_code == 0
+    assert 'Example Post' in post_path.read_text()
+
+    post_path.write_text('unchanged')
+    result = run_start.invoke(build)
+    assert result.exit_code == 0
+    assert re.search(SUCCESS_REGEX, result.output)
+    assert post_path.read_text() == 'unchanged'
+
+    result = run_start.invoke(build, ['--full'])
+    assert result.exit_code == 0
+    assert 'Example Post' in post_path.read_text()
+
+
+def test_build_renders_changed_post(run_start: CliRunner) -> None:
+    post_path = Path('build') / '2014' / '10' / '30' / 'example' / 'index.html'
+    result = run_start.invoke(build)
+    assert result.exit_code == 0
+
+    set_example_contents('Changed post text.')
+    result = run_start.invoke(build)
+    assert result.exit_code == 0
+    assert 'Changed post text.' in post_path.read_text()
+
+
+def test_build_renders_posts_when_inputs_change(run_start: CliRunner) -> None:
+    post_path = Path('build') / '2014' / '10' / '30' / 'example' / 'index.html'
+    result = run_start.invoke(build)
+    assert result.exit_code == 0
+
+    # Template changed
+    post_path.write_text('unchanged')
+    layout_path = Path('templates') / '_layout.html'
+    layout_path.write_text(layout_path.read_text() + '\n')
+    result = run_start.invoke(build)
+    assert result.exit_code == 0
+    assert 'Example Post' in post_path.read_text()
+
+    # Config changed
+    post_path.write_text('unchanged')
+    set_config_field('site', 'name', 'New Name')
+    result = run_start.invoke(build)
+    assert result.exit_code == 0
+    assert 'New Name' in post_path.read_text()
+
+    # Manifest is not valid
+    post_path.write_text('unchanged')
+    manifest_path = Path('.htmd-cache') / 'build-manifest.json'
+    manifest_path.write_text('{')
+    result = run_start.invoke(build)
+    assert result.exit_code == 0
+    assert 'Example Post' in post_path.read_text()
+
+
+def test_build_unchanged_protected_post_keeps_links(
+    run_start: CliRunner,
+) -> None:
+    set_example_password_value('')
+    js_path = Path('build') / 'static' / 'password-protect.js'
+    result = run_start.invoke(build)
+    assert result.exit_code == 0
+    assert js_path.is_file()
+
+    # password-protect.js is only linked from the protected post
+    result = run_start.invoke(build)
+    assert result.exit_code == 0
+    assert js_path.is_file()
+
+
+def test_build_jobs(run_start: CliRunner) -> None:
+    shutil.copyfile(
+        Path('posts') / 'example.md',
+        Path('posts') / 'sample.md',
+    )
+    result = run_start.invoke(build)
+    assert result.exit_code == 0
+    serial_files = {
+        path.relative_to('build'): path.read_bytes()
+        for path in Path('build').rglob('*.html')
+    }
+    shutil.rmtree('build')
+    shutil.rmtree('.htmd-cache')
+
+    result = run_start.invoke(build, ['--jobs', '2'])
+    assert result.exit_code == 0
+    assert re.search(SUCCESS_REGEX, result.output)
+    parallel_files = {
+        path.relative_to('build'): path.read_bytes()
+        for path in Path('build').rglob('*.html')
+    }
+    assert parallel_files == serial_files
+
+    # Unchanged posts are skipped
+    post_path = Path('build') / '2014' / '10' / '30' / 'example' / 'index.html'
+    post_path.write_text('unchanged')
+    result = run_start.invoke(build, ['--jobs', '2'])
+    assert result.exit_code == 0
+    assert post_path.read_text() == 'unchanged'
+
+
+def test_build_jobs_removes_extra_files(run_start: CliRunner) -> None:
+    extra_path = Path('build') / 'extra' / 'index.html'
+    extra_path.parent.mkdir(parents=True)
+    extra_path.write_text('extra')
+    result = run_start.invoke(build, ['-j', '2'])
+    assert result.exit_code == 0
+    assert not extra_path.exists()
+    assert not extra_path.parent.exists()
+
+
+def test_build_jobs_page_404(run_start: CliRunner) -> None:
+    about_path = Path('pages') / 'about.html'
+    link = '''<p><a href="{{ url_for('pages.page', path='dne') }}">DNE</a></p>'''
+    contents = about_path.read_text()
+    about_path.write_text(
+        contents.replace('<p>This is the about page.</p>', link),
+    )
+
+    result = run_start.invoke(build, ['--jobs', '2'])
+    assert result.exit_code == 1
+    assert "Unexpected status '404 NOT FOUND' on URL /dne/" in result.output
+
+
+def test_build_profile(run_start: CliRunner) -> None:
+    result = run_start.invoke(build, ['--profile'])
+    assert result.exit_code == 0
+    assert re.search(SUCCESS_REGEX, result.output)
+    for stage in ('create_app', 'verify', 'sync_posts', 'freeze', 'pagefind'):
+        stage_regex = rf'^{stage} +\d+\.\d{{3}} +\d+\.\d{{3}}$'
+        assert re.search(stage_regex, result.output, re.MULTILINE)
+    assert 'Slowest URLs' in result.output
+    assert '/2014/10/30/example/\n' in result.output
+    assert 'post.html (1 renders)' in result.output
+
+
+def test_build_profile_json(run_start: CliRunner) -> None:
+    profile_path = Path('profile.json')
+    result = run_start.invoke(
+        build,
+        ['--jobs', '2', '--profile-json', str(profile_path), '--profile-top', '0'],
+    )
+    assert result.exit_code == 0
+    assert '/2014/10/30/example/' not in result.output
+
+    profile = json.loads(profile_path.read_text())
+    assert list(profile['stages']) == [
+        'create_app',
+        'verify',
+        'sync_posts',
+        'freeze',
+        'pagefind',
+        'prune_caches',
+    ]
+    assert '/2014/10/30/example/' in profile['urls']
+    assert profile['templates']['post.html']['count'] == 1
+
+
+def test_build_jinja_bytecode_cache(run_start: CliRunner) -> None:
+    result = run_start.invoke(build)
+    assert result.exit_code == 0
+    jinja_cache = Path('.htmd-cache') / 'jinja'
+    assert list(jinja_cache.glob('*.cache'))
+
+
+@pytest.mark.parametrize('jobs', ['1', '2'])
+def test_build_precompile_templates(run_start: CliRunner, jobs: str) -> None:
+    result = run_start.invoke(build, ['--precompile-templates', '--jobs', jobs])
+    assert result.exit_code == 0
+    assert re.search(SUCCESS_REGEX, result.output)
+    jinja_cache = Path('.htmd-cache') / 'jinja'
+    # Every template and page is compiled, even if it is not used
+    assert len(list(jinja_cache.glob('*.cache'))) >= 15  # noqa: PLR2004
+
+
+def test_build_precompile_templates_syntax_error(run_start: CliRunner) -> None:
+    (Path('templates') / 'broken.html').write_text('{% if %}\n')
+    result = run_start.invoke(build, ['--precompile-templates'])
+    assert result.exit_code == 1
+    assert 'broken.html line 1:' in result.stderr
+    assert not (Path('build') / 'index.html').exists()
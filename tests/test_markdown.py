@@ -1,7 +1,9 @@
 from pathlib import Path
 
 from click.testing import CliRunner
+from flask import Flask
 from htmd.cli.build import build
+from htmd.site.posts import get_posts
 
 from utils import set_config_field, set_example_contents
 
@@ -59,3 +61,62 @@ def test_code_blocks(run_start: CliRunner) -> None:
     # a <pre> or a codehilite wrapper).
     assert '<pre' in contents
     assert 'class="codehilite"' in contents
+
+
+def test_html_cache(run_start: CliRunner) -> None:
+    result = run_start.invoke(build)
+    assert result.exit_code == 0
+
+    html_cache = Path('.htmd-cache') / 'html'
+    cached = list(html_cache.rglob('*.html'))
+    assert len(cached) == 1
+    assert 'This is the post <strong>text</strong>.' in cached[0].read_text()
+
+    # The cached HTML is used instead of rendering the markdown
+    cached[0].write_text('<p>From the cache.</p>')
+    result = run_start.invoke(build, ['--full'])
+    assert result.exit_code == 0
+    build_post = Path('build') / '2014' / '10' / '30' / 'example' / 'index.html'
+    assert 'From the cache.' in build_post.read_text()
+
+    # Changing the post body does not use the cached HTML
+    set_example_contents('This is the new **text**.')
+    result = run_start.invoke(build)
+    assert result.exit_code == 0
+    assert 'This is the new <strong>text</strong>.' in build_post.read_text()
+    # Only the HTML of the current post bodies is kept
+    cached = list(html_cache.rglob('*.html'))
+    assert len(cached) == 1
+    assert 'This is the new <strong>text</strong>.' in cached[0].read_text()
+
+
+def test_html_without_app_context(flask_app: Flask) -> None:
+    post = get_posts(flask_app).get('example')
+    assert post is not None
+    assert 'This is the post <strong>text</strong>.' in post.html
+    assert list((Path('.htmd-cache') / 'html').rglob('*.html'))
+
+
+def test_pygments_css(run_start: CliRunner) -> None:
+    set_example_contents('```python\nif a < b:\n    pass\n```\n')
+    result = run_start.invoke(build, ['--no-css-minify'])
+    assert result.exit_code == 0
+
+    css_path = Path('build') / 'static' / 'pygments.css'
+    css = css_path.read_text()
+    assert '.codehilite .k { color: #204A87; font-weight: bold }' in css
+    # Only tokens in code blocks are included
+    assert '.codehilite .s2 ' not in css
+
+    set_config_field('posts.markdown', 'pygments_style', 'monokai')
+    result = run_start.invoke(build)
+    assert result.exit_code == 0
+    # Minified with the other CSS files
+    assert '.codehilite .k{color:#66d9ef}' in css_path.read_text()
+
+
+def test_pygments_style_does_not_exist(run_start: CliRunner) -> None:
+    set_config_field('posts.markdown', 'pygments_style', 'dne')
+    result = run_start.invoke(build)
+    assert result.exit_code == 1
+    assert result.output == 'Pygments style dne does not exist\n'
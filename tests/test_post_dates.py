@@ -1,10 +1,19 @@
 import datetime
+import json
+import os
 from pathlib import Path
 
 from click.testing import CliRunner
 from flask import Flask
 from htmd.cli.build import build
-from htmd.utils import atomic_write, sync_posts
+from htmd.site.posts import get_posts
+from htmd.utils import (
+    atomic_write,
+    get_legacy_post_hash,
+    POST_HASH_PREFIX,
+    sync_posts,
+    SYNC_STATE_FILE,
+)
 
 from utils import (
     get_example_field,
@@ -546,3 +555,102 @@ def test_without_published_updated_date_hash_changed(
     updated = datetime.datetime.fromisoformat(updated_str)
     assert updated.date() == updated_date
     assert updated.time() == datetime.time.min
+
+
+def test_sync_posts_does_not_render(flask_app: Flask) -> None:
+    sync_posts(flask_app)
+
+    example = get_posts(flask_app).get('example')
+    assert example is not None
+    # html is a cached_property
+    assert 'html' not in example.__dict__
+    post_hash = get_example_field('_hash')
+    assert isinstance(post_hash, str)
+    assert post_hash.startswith(POST_HASH_PREFIX)
+
+
+def test_sync_posts_legacy_hash_is_replaced(flask_app: Flask) -> None:
+    remove_fields_from_post('example', ('updated',))
+    sync_posts(flask_app)
+
+    example = get_posts(flask_app).get('example')
+    assert example is not None
+    with flask_app.app_context():
+        legacy_hash = get_legacy_post_hash(example)
+    set_example_field('_hash', legacy_hash)
+
+    get_posts(flask_app).reload()
+    sync_posts(flask_app)
+
+    # The post is not considered updated
+    assert get_example_field('updated') is None
+    post_hash = get_example_field('_hash')
+    assert isinstance(post_hash, str)
+    assert post_hash.startswith(POST_HASH_PREFIX)
+
+
+def test_sync_posts_legacy_hash_changed(flask_app: Flask) -> None:
+    remove_fields_from_post('example', ('updated',))
+    sync_posts(flask_app)
+
+    set_example_field('_hash', 'legacyhashofanolderversionofthepost')
+    get_posts(flask_app).reload()
+    sync_posts(flask_app)
+
+    assert get_example_field('updated') is not None
+
+
+def test_sync_posts_skips_unchanged_files(flask_app: Flask) -> None:
+    sync_posts(flask_app)
+    state_path = Path('.htmd-cache') / SYNC_STATE_FILE
+    state = json.loads(state_path.read_text())
+    assert 'example' in state['files']
+    # Files changed at the time the state was saved are synced again
+    state_stat = state_path.stat()
+    future_ns = state_stat.st_mtime_ns + 10**9
+    os.utime(state_path, ns=(state_stat.st_atime_ns, future_ns))
+
+    # Change the file without changing its size, mtime, or inode
+    post_path = Path('posts') / 'example.md'
+    post_stat = post_path.stat()
+    post_hash = get_example_field('_hash')
+    assert isinstance(post_hash, str)
+    fake_hash = POST_HASH_PREFIX + '0' * (len(post_hash) - len(POST_HASH_PREFIX))
+    with post_path.open('r+') as post_file:
+        contents = post_file.read().replace(post_hash, fake_hash)
+        post_file.seek(0)
+        post_file.write(contents)
+    os.utime(post_path, ns=(post_stat.st_atime_ns, post_stat.st_mtime_ns))
+    get_posts(flask_app).reload()
+
+    sync_posts(flask_app)
+    assert get_example_field('_hash') == fake_hash
+
+    # A new modification time is synced
+    os.utime(post_path, ns=(post_stat.st_atime_ns, post_stat.st_mtime_ns + 1000))
+    sync_posts(flask_app)
+    assert get_example_field('_hash') == post_hash
+
+
+def test_sync_posts_invalid_state(flask_app: Flask) -> None:
+    state_path = Path('.htmd-cache') / SYNC_STATE_FILE
+    state_path.parent.mkdir(exist_ok=True)
+    state_path.write_text('{')
+    sync_posts(flask_app)
+    assert 'example' in json.loads(state_path.read_text())['files']
+
+    state_path.write_text(json.dumps({'options': 'old', 'files': {}}))
+    sync_posts(flask_app)
+    assert 'example' in json.loads(state_path.read_text())['files']
+
+
+def test_sync_posts_draft_password_is_synced_again(flask_app: Flask) -> None:
+    set_example_field('draft', 'true')
+    set_example_field('password', '')
+    get_posts(flask_app).reload()
+    sync_posts(flask_app)
+
+    # The generated password is not written to a draft
+    assert get_example_field('password') == ''
+    state_path = Path('.htmd-cache') / SYNC_STATE_FILE
+    assert 'example' not in json.loads(state_path.read_text())['files']
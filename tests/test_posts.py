@@ -2,13 +2,18 @@ from pathlib import Path
 import shutil
 
 from click.testing import CliRunner
+from htmd import site
 from htmd.cli.build import build
-from htmd.site.posts import Posts, truncate_post_html
+from htmd.site.freezer import day_view, month_view, year_view
+from htmd.site.posts import get_posts, Post, Posts, truncate_post_html
+from htmd.site.truncate_html import truncate_html
+import pytest
 
 from utils import (
     remove_fields_from_post,
     remove_from_config_field,
     set_config_field,
+    set_example_contents,
     set_example_field,
 )
 
@@ -148,6 +153,98 @@ def test_truncate_chaos_nesting() -> None:
     assert output == expected
 
 
+def test_truncate_stops_at_limit() -> None:
+    # Tags are closed and the unclosed HTML after the limit is not read
+    original = '<ul><li>One two three</li><li>Four</li></ul><div><p>Never closed'
+    assert truncate_post_html(original, 5) == '<ul><li>One t...</li></ul>'
+
+
+# The expected HTML is the same as the output of BeautifulSoup
+@pytest.mark.parametrize(('original', 'limit', 'expected'), [
+    (
+        '<p>Fish &amp; chips &copy; &nosuch; &lt;b&gt; and more text</p>',
+        12,
+        '<p>Fish &amp; chips...</p>',
+    ),
+    (
+        '<p>Fish &amp; chips &copy; &nosuch</p>',
+        100,
+        '<p>Fish &amp; chips © &amp;nosuch</p>',
+    ),
+    ('<p>A &#65;&#x42; char refs and more text</p>', 10, '<p>A AB char...</p>'),
+    (
+        '<p>Data <![CDATA[x < y]]> text and more</p>',
+        100,
+        '<p>Data <![CDATA[x < y]]> text and more</p>',
+    ),
+    (
+        '<p>Data <![if !IE]> text and more</p>',
+        100,
+        '<p>Data <?if !IE?> text and more</p>',
+    ),
+    (
+        '<?xml version="1.0"?><p>Processing instruction</p>',
+        100,
+        '<?xml version="1.0"?><p>Processing instruction</p>',
+    ),
+    (
+        '<!DOCTYPE html><p>Text <!-- a comment --> after</p>',
+        100,
+        '<!DOCTYPE html>\n<p>Text <!-- a comment --> after</p>',
+    ),
+    (
+        '<p>One</p></div></span><p>Two three four five</p>',
+        8,
+        '<p>One</p><p>Two t...</p>',
+    ),
+    ('<p>One</br><br>Two</p>', 100, '<p>One<br/>Two</p>'),
+    ('<div><p>Never closed', 100, '<div><p>Never closed</p></div>'),
+    (
+        '<p>Self closing <span/> and <br/> text</p>',
+        100,
+        '<p>Self closing <span></span> and <br/> text</p>',
+    ),
+    (
+        '<p>A<b>bold<i>nested</b>text</i> and more text after</p>',
+        12,
+        '<p>A<b>bold<i>nested</i></b>t...</p>',
+    ),
+    (
+        '<div>   </div><pre>   </pre><p>\n\n</p><p>Text here and more</p>',
+        6,
+        '<div> </div><pre>   </pre><p>\n</p><p>T...</p>',
+    ),
+])
+def test_truncate_html_markup(original: str, limit: int, expected: str) -> None:
+    assert truncate_html(original, limit) == expected
+
+
+def test_truncate_html_not_text() -> None:
+    # Unlike BeautifulSoup, comments, declarations, scripts, and styles
+    # are not counted as text
+    original = '<!DOCTYPE html><p>Text <!-- a comment --> after the comment</p>'
+    expected = '<!DOCTYPE html>\n<p>Text <!-- a comment --> af...</p>'
+    assert truncate_html(original, 8) == expected
+    original = '<script>let a = "<b>";</script><style>p > a {}</style><p>Text after</p>'
+    expected = '<script>let a = "<b>";</script><style>p > a {}</style><p>Text a...</p>'
+    assert truncate_html(original, 6) == expected
+
+
+def test_truncate_more(run_start: CliRunner) -> None:
+    original = '<p>Preview <em>text</em>.</p>\n<!--more-->\n\n<p>The rest.</p>'
+    expected = '<p>Preview <em>text</em>.</p>'
+    assert truncate_post_html(original) == expected
+    # The limit is not used when there is <!--more-->
+    assert truncate_post_html(original, 3) == expected
+
+    set_example_contents('The preview.\n\n<!--more-->\n\nThe rest of the post.')
+    result = run_start.invoke(build)
+    assert result.exit_code == 0
+    contents = (Path('build') / 'index.html').read_text()
+    assert 'The preview.' in contents
+    assert 'The rest of the post.' not in contents
+
+
 def test_post_comments(run_start: CliRunner) -> None:
     result = run_start.invoke(build)
     assert result.exit_code == 0
@@ -249,3 +346,137 @@ def test_posts_in_sub_directory(run_start: CliRunner) -> None:
     )
     assert build_path.is_file()
     assert 'Content of the nested post' in build_path.read_text()
+
+
+def test_posts_archive(run_start: CliRunner) -> None:  # noqa: ARG001
+    post_path = Path('posts') / 'example.md'
+    contents = post_path.read_text()
+    for name, published in (
+        ('newer', '2015-01-02'),
+        ('same_day', '2014-10-30 12:00:00+00:00'),
+    ):
+        new_contents = contents.replace('2014-10-30', published)
+        (Path('posts') / f'{name}.md').write_text(new_contents)
+
+    app = site.create_app()
+    posts = get_posts(app)
+    assert [p.path for p in posts.latest_posts] == [
+        'newer',
+        'same_day',
+        'example',
+    ]
+    assert list(posts.archive) == ['2014', '2015']
+    assert list(posts.archive['2014']) == ['10']
+    assert [p.path for p in posts.archive['2014']['10']['30']] == [
+        'example',
+        'same_day',
+    ]
+
+    # Each archive page is only frozen once
+    with app.test_request_context():
+        urls = [url for url, _ in year_view()]
+        urls += [url for url, _ in month_view()]
+        urls += [url for url, _ in day_view()]
+    assert urls == [
+        'posts.year_view',
+        'posts.year_view',
+        'posts.month_view',
+        'posts.month_view',
+        'posts.day_view',
+        'posts.day_view',
+    ]
+
+
+def test_new_post_is_listed_on_first_build(run_start: CliRunner) -> None:
+    remove_fields_from_post('example', ('published',))
+    result = run_start.invoke(build)
+    assert result.exit_code == 0
+    contents = (Path('build') / 'blog' / 'index.html').read_text()
+    assert 'Example Post' in contents
+
+
+def test_posts_indexes(run_start: CliRunner) -> None:  # noqa: ARG001
+    set_example_field('tags', '[first, second]')
+    draft_path = Path('posts') / 'draft.md'
+    contents = (Path('posts') / 'example.md').read_text()
+    draft_contents = contents.replace(
+        'published:',
+        'draft: build|abc\npublished:',
+    ).replace('author:', 'author: Someone Else\nold_author:')
+    draft_path.write_text(draft_contents)
+
+    app = site.create_app()
+    posts = get_posts(app)
+    assert sorted(p.path for p in posts.tags['first']) == ['draft', 'example']
+    assert posts.tag_counts == {'first': 1, 'second': 1}
+    assert sorted(posts.authors) == ['Someone Else', 'Taylor']
+    assert posts.drafts['abc'].path == 'draft'
+
+
+def test_post_urls(run_start: CliRunner) -> None:
+    set_config_field('site', 'url', 'https://example.com')
+    set_config_field('posts', 'url_prefix', '/myprefix/')
+    protected_dir = Path('posts') / 'password-protect'
+    protected_dir.mkdir(exist_ok=True)
+    (protected_dir / 'secret.md').write_text(
+        '---\n'
+        'title: Secret\n'
+        'author: Author\n'
+        'published: 2026-04-18\n'
+        'password: true\n'
+        '...\n'
+        'Secret.\n',
+    )
+    unpublished_path = Path('posts') / 'unpublished.md'
+    unpublished_path.write_text('---\ntitle: Unpublished\nauthor: Author\n...\nText.\n')
+
+    app = site.create_app()
+    posts = get_posts(app)
+    example = posts.get('example')
+    assert isinstance(example, Post)
+    assert example.url == '/myprefix/2014/10/30/example/'
+    assert example.external_url == 'https://example.com/myprefix/2014/10/30/example/'
+    secret = posts.get('password-protect/secret')
+    assert isinstance(secret, Post)
+    assert secret.url == '/myprefix/2026/04/18/secret/'
+    unpublished = posts.get('unpublished')
+    assert isinstance(unpublished, Post)
+    assert unpublished.url is None
+    assert unpublished.external_url is None
+
+    result = run_start.invoke(build)
+    assert result.exit_code == 0
+    post_path = Path('build') / 'myprefix' / '2014' / '10' / '30' / 'example'
+    contents = (post_path / 'index.html').read_text()
+    expected = '<meta property="og:url" content="https://example.com/myprefix/2014/10/30/example/">'
+    assert expected in contents
+    secret_path = Path('build') / 'myprefix' / '2026' / '04' / '18' / 'secret'
+    assert (secret_path / 'index.html').is_file()
+    all_posts = (Path('build') / 'blog' / 'index.html').read_text()
+    assert 'href="/myprefix/2026/04/18/secret/"' in all_posts
+
+
+def test_post_urls_site_url_with_path(run_start: CliRunner) -> None:
+    set_config_field('site', 'url', 'https://example.com/blog')
+    app = site.create_app()
+    posts = get_posts(app)
+    example = posts.get('example')
+    assert isinstance(example, Post)
+    assert example.url_path == '/2014/10/30/example/'
+    assert example.url == '/2014/10/30/example/'
+    assert example.external_url == 'https://example.com/blog/2014/10/30/example/'
+
+    # Preview serves the site from /
+    client = app.test_client()
+    response = client.get('/')
+    assert 'href="/2014/10/30/example/"' in response.text
+    assert client.get('/2014/10/30/example/').status_code == 200  # noqa: PLR2004
+
+    # The built site is served from /blog/
+    result = run_start.invoke(build)
+    assert result.exit_code == 0
+    index = (Path('build') / 'index.html').read_text()
+    assert 'href="/blog/2014/10/30/example/"' in index
+    post_path = Path('build') / '2014' / '10' / '30' / 'example' / 'index.html'
+    expected = '<meta property="og:url" content="https://example.com/blog/2014/10/30/example/">'
+    assert expected in post_path.read_text()
@@ -197,6 +197,37 @@ def test_preview_no_css_minify_no_js_minify(run_start: CliRunner) -> None:
             assert response.status_code == status, url
 
 
+def test_preview_bundle(run_start: CliRunner) -> None:
+    set_config_field('static', 'bundle', 'true')
+    args = ['--no-css-minify', '--js-minify']
+    js_path = Path('static') / 'scripts.js'
+    js_path.write_text('const body = document.body\n')
+    with (
+        run_preview(run_start, args) as base_url,
+        niquests.Session() as session,
+    ):
+        contents = http_get(base_url, session=session).text
+        assert contents is not None
+        assert '<link href="/static/bundle.css" rel="stylesheet">' in contents
+        assert '<script src="/static/bundle.js"></script>' in contents
+
+        response = http_get(base_url + '/static/bundle.css', session=session)
+        assert response.status_code == 200  # noqa: PLR2004
+        assert response.headers['Content-Type'].startswith('text/css')
+        css = response.text
+        assert css is not None
+        assert '.heading-link-icon' in css
+        # CSS files are only bundled when they are minified
+        assert 'box-sizing:border-box' not in css
+
+        response = http_get(base_url + '/static/bundle.js', session=session)
+        assert response.status_code == 200  # noqa: PLR2004
+        assert response.headers['Content-Type'].startswith('text/javascript')
+        js = response.text
+        assert js is not None
+        assert js.endswith('const body=document.body\n;\n')
+
+
 @pytest.mark.parametrize('static_dir', [
     'static',
     'foo',
@@ -1,8 +1,21 @@
+import base64
 from pathlib import Path
 import shutil
 
 from click.testing import CliRunner
+from cryptography.hazmat.primitives import hashes
+from cryptography.hazmat.primitives.asymmetric import padding
+from cryptography.hazmat.primitives.ciphers.aead import AESGCM
 from htmd.cli.build import build
+from htmd.password_protect import (
+    encrypt_post,
+    generate_password,
+    generate_passwords,
+    KeyPool,
+    load_private_key,
+    NONCE_SIZE,
+)
+from htmd.site import encrypted_cache
 import niquests
 
 from utils import (
@@ -10,6 +23,7 @@ from utils import (
     get_post_field,
     http_get,
     set_example_password_value,
+    set_example_subtitle,
     wait_for_str_not_in_file,
 )
 from utils_preview import run_preview
@@ -79,7 +93,7 @@ def test_new_protected_post_in_sub_dir_during_preview(run_start: CliRunner) -> N
     shutil.copy(Path('posts') / 'example.md', Path('copy.md'))
     subdir = Path('posts') / 'subdir'
     subdir.mkdir()
-    with run_preview(run_start) as base_url:
+    with run_preview(run_start, ['--jobs', '2']) as base_url:
         post_path = subdir / 'copy.md'
         shutil.copy(Path('copy.md'), post_path)
         wait_for_str_not_in_file(post_path, 'password: \n')
@@ -136,3 +150,120 @@ def test_password_protect_in_sub_directory(run_start: CliRunner) -> None:
 
     assert 'cipherHTML' in contents
     assert 'This is encrypted content.' not in contents
+
+
+def test_build_jobs_protected_posts(run_start: CliRunner) -> None:
+    protected_dir = Path('posts') / 'password-protect'
+    protected_dir.mkdir(parents=True, exist_ok=True)
+    for name in ('first', 'second'):
+        post_content = (
+            '---\n'
+            f'title: {name}\n'
+            'published: 2026-04-18\n'
+            'author: Author\n'
+            'password:\n'
+            '...\n'
+            'Encrypted.\n'
+        )
+        (protected_dir / f'{name}.md').write_text(post_content)
+
+    result = run_start.invoke(build, ['--jobs', '2'])
+    assert result.exit_code == 0
+
+    # The password is a YAML block
+    first = (protected_dir / 'first.md').read_text().split('password: |')[1]
+    second = (protected_dir / 'second.md').read_text().split('password: |')[1]
+    assert first.split('...')[0].strip()
+    assert first.split('...')[0] != second.split('...')[0]
+
+
+def test_generate_passwords() -> None:
+    passwords = generate_passwords(3, jobs=2)
+    assert len(set(passwords)) == 3  # noqa: PLR2004
+    for password in passwords:
+        encrypt_post('<p>Post</p>', 'Title', None, password)
+
+
+def test_key_pool() -> None:
+    pool = KeyPool(size=1)
+    assert pool.get(0) == []
+    try:
+        pool.start()
+        first = pool.get()
+        second = pool.get()
+    finally:
+        pool.close()
+    assert len(first) == 1
+    assert len(second) == 1
+    assert first != second
+    encrypt_post('<p>Post</p>', 'Title', None, first[0])
+    # Closing again does nothing
+    pool.close()
+
+
+def test_encrypt_post_long_html() -> None:
+    password = generate_password()
+    html = '<p>' + 'A long post. ' * 1000 + '</p>'
+    cipher_html, cipher_title, cipher_subtitle = encrypt_post(
+        html,
+        'Title',
+        None,
+        password,
+    )
+
+    private_key = load_private_key(password)
+    html_b = base64.b64decode(cipher_html)
+    key_size = private_key.key_size // 8
+    content_key = private_key.decrypt(
+        html_b[:key_size],
+        padding.OAEP(
+            mgf=padding.MGF1(algorithm=hashes.SHA256()),
+            algorithm=hashes.SHA256(),
+            label=None,
+        ),
+    )
+    aesgcm = AESGCM(content_key)
+
+    def decrypt(cipher_b: bytes, field: str) -> str:
+        nonce, data = cipher_b[:NONCE_SIZE], cipher_b[NONCE_SIZE:]
+        return aesgcm.decrypt(nonce, data, field.encode('utf-8')).decode('utf-8')
+
+    assert decrypt(html_b[key_size:], 'html') == html
+    assert decrypt(base64.b64decode(cipher_title), 'title') == 'Title'
+    assert decrypt(base64.b64decode(cipher_subtitle), 'subtitle') == ''
+
+
+def test_build_encrypted_post_is_cached(run_start: CliRunner) -> None:
+    example_path = Path('posts') / 'example.md'
+    example = example_path.read_text()
+    set_example_password_value('')
+    result = run_start.invoke(build)
+    assert result.exit_code == 0
+    post_path = Path('build') / '2014' / '10' / '30' / 'example' / 'index.html'
+    contents = post_path.read_text()
+    encrypted_folder = Path('.htmd-cache') / 'encrypted'
+    assert len(list(encrypted_folder.rglob('*.json'))) == 1
+
+    # Encrypted in memory
+    result = run_start.invoke(build, ['--full'])
+    assert result.exit_code == 0
+    assert post_path.read_text() == contents
+
+    # Encrypted in a previous run
+    encrypted_cache._encrypted_posts.clear()  # noqa: SLF001
+    result = run_start.invoke(build, ['--full'])
+    assert result.exit_code == 0
+    assert post_path.read_text() == contents
+
+    set_example_subtitle('A new subtitle')
+    result = run_start.invoke(build)
+    assert result.exit_code == 0
+    assert post_path.read_text() != contents
+    # Only the encrypted fields of the current post are kept
+    assert len(list(encrypted_folder.rglob('*.json'))) == 1
+
+    # The post is not protected
+    example_path.write_text(example)
+    result = run_start.invoke(build)
+    assert result.exit_code == 0
+    assert not list(encrypted_folder.rglob('*.json'))
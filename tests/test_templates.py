@@ -1,5 +1,12 @@
+import datetime as dt
+
 from click.testing import CliRunner
+from flask import Flask, render_template, render_template_string
 from htmd.cli.templates import templates
+from htmd.site import fragment_cache
+from htmd.site.fragment_cache import clear_fragment_cache, FragmentCacheExtension
+from htmd.site.posts import all_posts, get_posts
+import pytest
 
 
 def test_templates(run_start: CliRunner) -> None:
@@ -30,3 +37,89 @@ def test_templates_without_folder() -> None:
         result = runner.invoke(templates)
     assert result.exit_code == 1
     assert result.stderr == expected_output
+
+
+def test_fragment_cache(flask_app: Flask) -> None:
+    calls = []
+
+    def render_count() -> int:
+        calls.append(1)
+        return len(calls)
+
+    template = (
+        '{% for key in keys %}'
+        '{% cache key %}{{ render_count() }}{% endcache %},'
+        '{% endfor %}'
+    )
+    with flask_app.app_context():
+        rendered = render_template_string(
+            template,
+            keys=['a', 'b', 'a'],
+            render_count=render_count,
+        )
+        assert rendered == '1,2,1,'
+
+        clear_fragment_cache(flask_app)
+        rendered = render_template_string(
+            template,
+            keys=['a'],
+            render_count=render_count,
+        )
+        assert rendered == '3,'
+
+
+def test_fragment_cache_post_changed(flask_app: Flask) -> None:
+    posts = get_posts(flask_app)
+    with flask_app.test_request_context():
+        before = all_posts()
+        example = posts.get('example')
+        assert example is not None
+        example.meta['subtitle'] = 'A new subtitle'
+        posts.reindex()
+        after = all_posts()
+    assert isinstance(before, str)
+    assert isinstance(after, str)
+    assert 'A new subtitle' not in before
+    assert 'A new subtitle' in after
+
+
+def get_fragments(flask_app: Flask) -> dict[object, str]:
+    extension = flask_app.jinja_env.extensions[FragmentCacheExtension.identifier]
+    assert isinstance(extension, FragmentCacheExtension)
+    return extension.fragments
+
+
+def test_fragment_cache_template_changed(flask_app: Flask) -> None:
+    with flask_app.app_context():
+        first = render_template_string('{% cache 1 %}first{% endcache %}')
+        second = render_template_string('{% cache 1 %}second{% endcache %}')
+    assert first == 'first'
+    assert second == 'second'
+
+
+def test_fragment_cache_today(flask_app: Flask) -> None:
+    posts = get_posts(flask_app)
+    morning = dt.datetime(2026, 1, 2, 8, tzinfo=dt.UTC)
+    with flask_app.test_request_context():
+        for hour in (8, 12, 20):
+            render_template(
+                'tag.html',
+                posts=posts.tags['first'],
+                tag='first',
+                today=morning.replace(hour=hour),
+            )
+    # Only the date is part of the key
+    assert len(get_fragments(flask_app)) == len(posts.tags['first'])
+
+
+def test_fragment_cache_limit(
+    flask_app: Flask,
+    monkeypatch: pytest.MonkeyPatch,
+) -> None:
+    monkeypatch.setattr(fragment_cache, 'MAX_FRAGMENTS', 2)
+    template = '{% for key in keys %}{% cache key %}{{ key }}{% endcache %}{% endfor %}'
+    with flask_app.app_context():
+        rendered = render_template_string(template, keys=['a', 'b', 'a', 'c'])
+    assert rendered == 'abac'
+    # b is the least recently used
+    assert list(get_fragments(flask_app).values()) == ['a', 'c']
@@ -5,9 +5,12 @@ from click.testing import CliRunner
 from flask import Flask
 from flask_flatpages import Page
 from htmd.site.posts import get_posts
+from htmd.site.pretty_html import prettify
 from htmd.utils import (
     atomic_write,
     get_static_files,
+    minify_static_files,
+    prune_minified_cache,
     set_post_metadata,
     validate_post,
 )
@@ -198,3 +201,101 @@ def test_get_static_files_no_dot_in_extension(
     static_files = get_static_files(Path('static'), 'css')
     expected = ['_reset.css', 'style.css']
     assert [file.name for file in static_files] == expected
+
+
+def test_minify_static_files_cache(
+    run_start: CliRunner,  # noqa: ARG001
+) -> None:
+    static_path = Path('static')
+    files = get_static_files(static_path, '.css')
+    build_path = Path('build') / 'static'
+    cache_path = Path('.htmd-cache')
+    minified = minify_static_files(
+        static_path,
+        files,
+        build_path,
+        cache_folder=cache_path,
+        jobs=2,
+    )
+    assert minified == ['_reset.min.css', 'style.min.css']
+    style_path = build_path / 'style.min.css'
+
+    # Unchanged files are read from the cache and not written again
+    [style_cache] = [
+        path
+        for path in (cache_path / 'minified-static').rglob('*.css')
+        if path.read_text() == style_path.read_text()
+    ]
+    atomic_write(style_cache, 'from the cache')
+    minify_static_files(static_path, files, build_path, cache_folder=cache_path)
+    assert style_path.read_text() == 'from the cache'
+    reset_path = build_path / '_reset.min.css'
+    reset_mtime = reset_path.stat().st_mtime_ns
+    minify_static_files(static_path, files, build_path, cache_folder=cache_path)
+    assert reset_path.stat().st_mtime_ns == reset_mtime
+
+    # A changed file is minified again
+    with (static_path / 'style.css').open('a') as css_file:
+        css_file.write('body { color: red; }\n')
+    minify_static_files(static_path, files, build_path, cache_folder=cache_path)
+    assert style_path.read_text().endswith('body{color:red}')
+
+    # Only the minified files of the current files are kept
+    minified_cache = cache_path / 'minified-static'
+    assert len(list(minified_cache.rglob('*.css'))) == 3  # noqa: PLR2004
+    prune_minified_cache(cache_path, files)
+    cached = sorted(path.read_text() for path in minified_cache.rglob('*.css'))
+    assert cached == sorted(
+        (build_path / name).read_text()
+        for name in ('_reset.min.css', 'style.min.css')
+    )
+
+
+# The expected HTML is the same as BeautifulSoup(html, 'html.parser').prettify()
+@pytest.mark.parametrize(('original', 'expected'), [
+    (
+        '<p class="a  b" title=\'say "hi"\' data-x="it\'s &quot;q&quot;">x</p>',
+        '<p class="a b" data-x="it\'s &quot;q&quot;" title=\'say "hi"\'>\n x\n</p>\n',
+    ),
+    (
+        (
+            '<meta http-equiv="Content-Type" content="text/html; charset=latin-1">'
+            '<meta charset="latin-1">'
+        ),
+        (
+            '<meta content="text/html; charset=utf-8" http-equiv="Content-Type"/>\n'
+            '<meta charset="utf-8"/>\n'
+        ),
+    ),
+    (
+        '<p>One<span/><br/>Two</p></div></span>',
+        '<p>\n One\n <span>\n </span>\n <br/>\n Two\n</p>\n',
+    ),
+    (
+        '<p>A<b>bold<i>nested</b>text</p>',
+        '<p>\n A\n <b>\n  bold\n  <i>\n   nested\n  </i>\n </b>\n text\n</p>\n',
+    ),
+    (
+        '<p>Fish &amp; chips &copy; &nosuch; &#65;&#x42;</p>',
+        '<p>\n Fish &amp; chips © &amp;nosuch AB\n</p>\n',
+    ),
+    (
+        (
+            '<!DOCTYPE html><!-- comment --><?xml version="1.0"?>'
+            '<p>a<![CDATA[x < y]]><![if !IE]></p>'
+        ),
+        (
+            '<!DOCTYPE html>\n<!-- comment -->\n<?xml version="1.0"?>\n'
+            '<p>\n a\n <![CDATA[x < y]]>\n <?if !IE?>\n</p>\n'
+        ),
+    ),
+    (
+        '<pre>  keep <b> this </b><!-- c --> &amp; </pre>',
+        '<pre>  keep <b> this </b><!-- c --> &amp; </pre>\n',
+    ),
+    ('<pre><pre> nested </pre></pre>', '<pre><pre> nested </pre></pre>\n'),
+    ('<script>if (a < b) {}</script>', '<script>\n if (a < b) {}\n</script>\n'),
+    ('<div><p>Never closed', '<div>\n <p>\n  Never closed\n </p>\n</div>\n'),
+])
+def test_prettify(original: str, expected: str) -> None:
+    assert prettify(original) == expected
@@ -1,3 +1,5 @@
+import json
+import os
 from pathlib import Path
 
 from click.testing import CliRunner
@@ -15,6 +17,8 @@ def test_verify(run_start: CliRunner) -> None:
     assert result.exit_code == 0
     expected_output = 'All posts are correctly formatted.\n'
     assert result.output == expected_output
+    # Static files are not minified
+    assert not (Path('build') / 'static').exists()
 
 
 def test_verify_author_missing(run_start: CliRunner) -> None:
@@ -125,3 +129,104 @@ def test_verify_no_config(run_start: CliRunner) -> None:
 
     assert result.exit_code == 1
     assert result.output == expected_output
+
+
+def write_post_without_title() -> None:
+    contents = (
+        '---\n'
+        'author: Taylor\n'
+        'published: 2014-10-30\n'
+        '...\n'
+        'No title.\n'
+    )
+    Path('posts/untitled.md').write_text(contents)
+
+
+def test_verify_every_error(run_start: CliRunner) -> None:
+    remove_fields_from_post('example', ('author',))
+    write_post_without_title()
+
+    result = run_start.invoke(verify)
+    assert result.exit_code == 1
+    expected_output = (
+        'Post "example" does not have field author.\n'
+        'Post "untitled" does not have field title.\n'
+    )
+    assert result.stderr == expected_output
+
+
+def test_verify_jobs(run_start: CliRunner) -> None:
+    remove_fields_from_post('example', ('author',))
+    write_post_without_title()
+
+    result = run_start.invoke(verify, ['--jobs', '2'])
+    assert result.exit_code == 1
+    expected_output = (
+        'Post "example" does not have field author.\n'
+        'Post "untitled" does not have field title.\n'
+    )
+    assert result.stderr == expected_output
+
+
+def test_verify_report(run_start: CliRunner) -> None:
+    write_post_without_title()
+
+    result = run_start.invoke(verify, ['--report', 'report.json'])
+    assert result.exit_code == 1
+    report = json.loads(Path('report.json').read_text())
+    assert report == {
+        'posts': 2,
+        'errors': {'untitled': ['Post "untitled" does not have field title.']},
+    }
+
+
+def test_verify_cache(run_start: CliRunner) -> None:
+    write_post_without_title()
+    result = run_start.invoke(verify)
+    assert result.exit_code == 1
+    assert Path('.htmd-cache/verify.json').is_file()
+
+    # Errors are reported from the cache
+    result = run_start.invoke(verify)
+    assert result.exit_code == 1
+    assert result.stderr == 'Post "untitled" does not have field title.\n'
+
+    # Only the modification time changed
+    post_path = Path('posts/untitled.md')
+    stat = post_path.stat()
+    os.utime(post_path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1000))
+    result = run_start.invoke(verify)
+    assert result.exit_code == 1
+    assert result.stderr == 'Post "untitled" does not have field title.\n'
+
+    # Same size with different contents
+    contents = post_path.read_text().replace('2014-10-30', '2014-1-30 ')
+    post_path.write_text(contents)
+    os.utime(post_path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 2000))
+    result = run_start.invoke(verify)
+    assert result.exit_code == 1
+    expected_output = (
+        'Post "untitled" does not have field title.\n'
+        'Published date 2014-1-30 for untitled is not in the format YYYY-MM-DD.\n'
+    )
+    assert result.stderr == expected_output
+
+
+def test_verify_cache_options_changed(run_start: CliRunner) -> None:
+    remove_fields_from_post('example', ('author',))
+    result = run_start.invoke(verify)
+    assert result.exit_code == 1
+
+    set_config_field('posts.author', 'default_name', 'Taylor')
+    result = run_start.invoke(verify)
+    assert result.exit_code == 0
+
+
+def test_verify_cache_invalid(run_start: CliRunner) -> None:
+    cache_path = Path('.htmd-cache/verify.json')
+    cache_path.parent.mkdir(exist_ok=True)
+    cache_path.write_text('{')
+
+    result = run_start.invoke(verify)
+    assert result.exit_code == 0
+    assert json.loads(cache_path.read_text())['posts']['example']['errors'] == []
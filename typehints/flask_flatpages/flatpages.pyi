@@ -30,3 +30,5 @@ class FlatPages:
     
     @property
     def _pages(self) -> dict[str, Page]: ...
+
+    def _parse(self, content: str, path: str, rel_path: str) -> Page: ...
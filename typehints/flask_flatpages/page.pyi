@@ -9,6 +9,8 @@ class Page:
     # The renderer receives the Page instance and returns rendered HTML
     html_renderer: Callable[["Page"], str]
     folder: str
+    # YAML of the metadata
+    _meta: str
     # Fixes: [type-arg]
     meta: dict[str, Any]
 
@@ -62,6 +62,15 @@ class Freezer:
     def freeze_yield(self) -> Iterator[Page]: ...
     def freeze(self) -> set[str]: ...
     def all_urls(self) -> Iterator[str]: ...
+    def _generate_all_urls(
+        self,
+    ) -> Iterator[tuple[str, str | None, datetime.datetime | None]]: ...
+    def _check_endpoints(self, seen_endpoints: set[str | None]) -> None: ...
+    def _build_one(
+        self,
+        url: str,
+        last_modified: datetime.datetime | None = None,
+    ) -> pathlib.Path: ...
     def urlpath_to_filepath(self, path: str) -> str: ...
     def serve(self, **options: Any) -> None: ...
     def run(self, **options: Any) -> None: ...